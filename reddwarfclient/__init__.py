@@ -15,5 +15,6 @@
 
 
 from reddwarfclient.commands import resources
+from reddwarfclient.client import AsyncDbaas
 from reddwarfclient.client import Dbaas
 from reddwarfclient.client import ReddwarfHTTPClient
@@ -12,8 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 from reddwarfclient import exceptions
 from reddwarfclient import utils
+from reddwarfclient.tokencache import token_expires
 
 
 authenticators = utils.Registry()
@@ -60,38 +63,69 @@ class Authenticator(object):
         self.args = args
 
     def _authenticate(self, url, body, root_key='access'):
-        """Authenticate and extract the service catalog."""
-        # Make sure we follow redirects when trying to reach Keystone
-        tmp_follow_all_redirects = self.client.follow_all_redirects
-        self.client.follow_all_redirects = True
+        """Authenticate and extract the service catalog.
 
-        try:
-            resp, body = self.client._time_request(url, "POST", body=body)
-        finally:
-            self.client.follow_all_redirects = tmp_follow_all_redirects
+        If the client has a token cache, a cached login is used instead
+        while its token is good, and a new login is cached.
+        """
+        cache = getattr(self.client, 'token_cache', None)
+        if cache is None:
+            return self._catalog(self._request_token(url, body), root_key)
+        key = self._cache_key(cache)
+        # Green clients wait for another's login without blocking the hub.
+        sleep = getattr(self.client, 'sleep', time.sleep)
+        with cache.lock(key, sleep=sleep):
+            cached = cache.get(key)
+            if cached is not None:
+                response, root_key = cached
+            else:
+                response = self._request_token(url, body)
+                if isinstance(response, dict):
+                    cache.put(key, response, root_key)
+        return self._catalog(response, root_key)
+
+    def _cache_key(self, cache):
+        return cache.key(self.url, self.username, self.tenant, self.region,
+                         self.password)
+
+    def forget_token(self):
+        """Drops the cached login, if any, so the next one is fresh."""
+        cache = getattr(self.client, 'token_cache', None)
+        if cache is not None:
+            cache.delete(self._cache_key(cache))
+
+    def _request_token(self, url, body):
+        """Logs in, returning the response body or a 305's location."""
+        # Make sure we follow redirects when trying to reach Keystone
+        resp, body = self.client._time_request(url, "POST", body=body,
+                                               follow_all_redirects=True)
 
         if resp.status == 200:  # content must always present
-            try:
-                return ServiceCatalog(body, region=self.region,
-                                      service_type=self.service_type,
-                                      service_name=self.service_name,
-                                      service_url=self.service_url,
-                                      root_key=root_key)
-            except exceptions.AmbiguousEndpoints:
-                print "Found more than one valid endpoint. Use a more "\
-                      "restrictive filter"
-                raise
-            except KeyError:
-                raise exceptions.AuthorizationFailure()
-            except exceptions.EndpointNotFound:
-                print "Could not find any suitable endpoint. Correct region?"
-                raise
-
+            return body
         elif resp.status == 305:
             return resp['location']
         else:
             raise exceptions.from_response(resp, body)
 
+    def _catalog(self, body, root_key):
+        if not isinstance(body, dict):
+            return body
+        try:
+            return ServiceCatalog(body, region=self.region,
+                                  service_type=self.service_type,
+                                  service_name=self.service_name,
+                                  service_url=self.service_url,
+                                  root_key=root_key)
+        except exceptions.AmbiguousEndpoints:
+            print "Found more than one valid endpoint. Use a more "\
+                  "restrictive filter"
+            raise
+        except KeyError:
+            raise exceptions.AuthorizationFailure()
+        except exceptions.EndpointNotFound:
+            print "Could not find any suitable endpoint. Correct region?"
+            raise
+
     def authenticate(self):
         raise NotImplementedError("Missing authenticate method.")
 
@@ -168,11 +202,75 @@ class FakeAuth(Authenticator):
         return FakeCatalog(self)
 
 
+class EndpointIndex(object):
+    """
+    The endpoints of a service catalog, indexed for lookups.
+
+    Each endpoint is a copy of the catalog's with the service's "type" and
+    "serviceName" added. They are filed under every (type, name, region,
+    interface) they match, with None standing for any, so a lookup by any
+    combination of those is a single dict access. An interface is an
+    endpoint key such as "publicURL" or "adminURL". ``endpoints`` holds
+    plain dicts in catalog order, from which an equal index can be made.
+    """
+
+    def __init__(self, endpoints=()):
+        self.endpoints = list(endpoints)
+        self._index = {}
+        for endpoint in self.endpoints:
+            interfaces = [None] + [key for key in endpoint
+                                   if key.endswith('URL')]
+            for service_type in set([None, endpoint.get('type')]):
+                for name in set([None, endpoint.get('serviceName')]):
+                    for region in set([None, endpoint.get('region')]):
+                        for interface in interfaces:
+                            key = (service_type, name, region, interface)
+                            self._index.setdefault(key, []).append(endpoint)
+
+    @classmethod
+    def from_services(cls, services):
+        """Indexes the "serviceCatalog" list of an auth response."""
+        endpoints = []
+        for service in services:
+            for endpoint in service.get('endpoints', []):
+                endpoint = dict(endpoint)
+                endpoint['type'] = service.get('type')
+                endpoint['serviceName'] = service.get('name')
+                endpoints.append(endpoint)
+        return cls(endpoints)
+
+    def find(self, service_type=None, service_name=None, region=None,
+             interface=None):
+        """Returns the endpoints matching every criterion given."""
+        return list(self._index.get((service_type, service_name, region,
+                                     interface), []))
+
+    def urls(self, interface, service_type=None, service_name=None,
+             region=None):
+        """Returns the ``interface`` URLs of the matching endpoints."""
+        return [endpoint[interface] for endpoint in
+                self.find(service_type, service_name, region, interface)]
+
+    def regions(self, service_type=None, service_name=None):
+        """Returns the regions which offer a service, in catalog order."""
+        regions = []
+        for endpoint in self.find(service_type, service_name):
+            region = endpoint.get('region')
+            if region is not None and region not in regions:
+                regions.append(region)
+        return regions
+
+    def __len__(self):
+        return len(self.endpoints)
+
+
 class ServiceCatalog(object):
     """Represents a Keystone Service Catalog which describes a service.
 
     This class has methods to obtain a valid token as well as a public service
-    url and a management url.
+    url and a management url. The catalog is parsed once into an
+    EndpointIndex, ``index``, which answers other questions about it, such
+    as which regions offer a service, without logging in again.
 
     """
 
@@ -186,40 +284,101 @@ class ServiceCatalog(object):
         self.management_url = None
         self.public_url = None
         self.root_key = root_key
+        access = resource_dict.get(root_key)
+        if isinstance(access, dict):
+            services = access.get('serviceCatalog', [])
+        else:
+            services = []
+        self.index = EndpointIndex.from_services(services)
         self._load()
 
     def _load(self):
         if not self.service_url:
-            self.public_url = self._url_for(attr='region',
-                                            filter_value=self.region,
-                                            endpoint_type="publicURL")
-            self.management_url = self._url_for(attr='region',
-                                                filter_value=self.region,
-                                                endpoint_type="adminURL")
+            endpoint = self._endpoint()
+            self.public_url = endpoint.get('publicURL')
+            self.management_url = endpoint.get('adminURL')
         else:
             self.public_url = self.service_url
             self.management_url = self.service_url
 
+    def _service_name(self):
+        # Only Reddwarf itself is told apart by name.
+        if self.service_type == 'reddwarf':
+            return self.service_name or None
+        return None
+
+    def to_dict(self):
+        """Returns what from_dict() needs to make this catalog again, for
+        keeping it in a cache."""
+        return {'catalog': self.catalog, 'root_key': self.root_key,
+                'region': self.region, 'service_type': self.service_type,
+                'service_name': self.service_name,
+                'service_url': self.service_url}
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(value['catalog'], region=value['region'],
+                   service_type=value['service_type'],
+                   service_name=value['service_name'],
+                   service_url=value['service_url'],
+                   root_key=value['root_key'])
+
     def get_token(self):
         return self.catalog[self.root_key]['token']['id']
 
+    def get_token_expires(self):
+        """When the token expires, in seconds since the epoch, or None."""
+        return token_expires(self.catalog, self.root_key)
+
     def get_management_url(self):
         return self.management_url
 
     def get_public_url(self):
         return self.public_url
 
-    def _url_for(self, attr=None, filter_value=None,
-                 endpoint_type='publicURL'):
+    def get_urls(self, endpoint_type='publicURL'):
+        """
+        Returns every URL of the given type for the Reddwarf service, in
+        any region, with the ones in this catalog's region first.
         """
-        Fetch the public URL from the Reddwarf service for a particular
-        endpoint attribute. If none given, return the first.
+        service_name = self._service_name()
+        candidates = []
+        if self.region:
+            candidates = self.index.urls(endpoint_type, self.service_type,
+                                         service_name, self.region)
+        candidates += self.index.urls(endpoint_type, self.service_type,
+                                      service_name)
+        urls = []
+        for url in candidates:
+            if url and url not in urls:
+                urls.append(url)
+        return urls
+
+    def get_endpoints(self, service_type=None, service_name=None,
+                      region=None, interface=None):
+        """Returns the endpoints of any service in the catalog which match
+        every criterion given, e.g. all those in one region."""
+        return self.index.find(service_type, service_name, region,
+                               interface)
+
+    def get_regions(self, service_type=None):
+        """Returns the regions which offer ``service_type``, this catalog's
+        service by default."""
+        if service_type is None:
+            return self.index.regions(self.service_type,
+                                      self._service_name())
+        return self.index.regions(service_type)
+
+    def _endpoint(self):
+        """
+        Fetch the endpoint of the Reddwarf service in this catalog's region,
+        or the only one if no region was given.
         """
         matching_endpoints = []
         if 'endpoints' in self.catalog:
             # We have a bastardized service catalog. Treat it special. :/
             for endpoint in self.catalog['endpoints']:
-                if not filter_value or endpoint[attr] == filter_value:
+                if not self.region or endpoint['region'] == self.region:
                     matching_endpoints.append(endpoint)
             if not matching_endpoints:
                 raise exceptions.EndpointNotFound()
@@ -228,29 +387,16 @@ class ServiceCatalog(object):
         if not 'serviceCatalog' in self.catalog[self.root_key]:
             raise exceptions.EndpointNotFound()
 
-        # Full catalog ...
-        catalog = self.catalog[self.root_key]['serviceCatalog']
-
-        for service in catalog:
-            if service.get("type") != self.service_type:
-                continue
-
-            if (self.service_name and self.service_type == 'reddwarf' and
-                service.get('name') != self.service_name):
-                continue
-
-            endpoints = service['endpoints']
-            for endpoint in endpoints:
-                if not filter_value or endpoint.get(attr) == filter_value:
-                    endpoint["serviceName"] = service.get("name")
-                    matching_endpoints.append(endpoint)
+        matching_endpoints.extend(self.index.find(self.service_type,
+                                                  self._service_name(),
+                                                  self.region or None))
 
         if not matching_endpoints:
             raise exceptions.EndpointNotFound()
         elif len(matching_endpoints) > 1:
             raise exceptions.AmbiguousEndpoints(endpoints=matching_endpoints)
         else:
-            return matching_endpoints[0].get(endpoint_type, None)
+            return matching_endpoints[0]
 
 
 authenticators.register('keystone', KeyStoneV2Authenticator)
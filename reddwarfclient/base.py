@@ -22,6 +22,7 @@ Base utilities to build API operation managers and objects on top of.
 import contextlib
 import hashlib
 import os
+import threading
 from reddwarfclient import exceptions
 from reddwarfclient import utils
 
@@ -55,6 +56,8 @@ class Manager(utils.HookableMixin):
 
     def __init__(self, api):
         self.api = api
+        # Open completion cache files, per thread.
+        self._local = threading.local()
 
     def _list(self, url, response_key, obj_class=None, body=None):
         resp = None
@@ -119,7 +122,7 @@ class Manager(utils.HookableMixin):
         cache_attr = "_%s_cache" % cache_type
 
         try:
-            setattr(self, cache_attr, open(path, mode))
+            setattr(self._local, cache_attr, open(path, mode))
         except IOError:
             # NOTE(kiall): This is typicaly a permission denied while
             #              attempting to write the cache file.
@@ -128,13 +131,13 @@ class Manager(utils.HookableMixin):
         try:
             yield
         finally:
-            cache = getattr(self, cache_attr, None)
+            cache = getattr(self._local, cache_attr, None)
             if cache:
                 cache.close()
-                delattr(self, cache_attr)
+                delattr(self._local, cache_attr)
 
     def write_to_completion_cache(self, cache_type, val):
-        cache = getattr(self, "_%s_cache" % cache_type, None)
+        cache = getattr(self._local, "_%s_cache" % cache_type, None)
         if cache:
             cache.write("%s\n" % val)
 
@@ -209,6 +212,12 @@ class ManagerWithFind(Manager):
         raise NotImplementedError
 
 
+def _tracer_for(manager):
+    """The tracer of the client behind ``manager``, if it has one."""
+    client = getattr(getattr(manager, 'api', None), 'client', None)
+    return getattr(client, 'tracer', None)
+
+
 class Resource(object):
     """
     A resource represents a particular instance of an object (server, flavor,
@@ -223,7 +232,12 @@ class Resource(object):
     def __init__(self, manager, info, loaded=False):
         self.manager = manager
         self._info = info
-        self._add_details(info)
+        tracer = _tracer_for(manager)
+        if tracer is None:
+            self._add_details(info)
+        else:
+            with tracer.span('resource', type=self.__class__.__name__):
+                self._add_details(info)
         self._loaded = loaded
 
         # NOTE(sirp): ensure `id` is already present because if it isn't we'll
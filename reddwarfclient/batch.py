@@ -0,0 +1,172 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Runs queued manager calls concurrently over one shared client.
+"""
+
+import Queue
+import sys
+import threading
+
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class BatchResult(object):
+    """The outcome of one queued call.
+
+    ``value`` holds what the call returned, or ``exception`` what it raised.
+    Both are None until the batch has run.
+    """
+
+    def __init__(self, name, args, kwargs):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.exception = None
+        self.exc_info = None
+        self.done = False
+
+    @property
+    def failed(self):
+        return self.exception is not None
+
+    def __repr__(self):
+        if not self.done:
+            state = "pending"
+        elif self.failed:
+            state = "failed: %r" % self.exception
+        else:
+            state = "ok"
+        return "<BatchResult %s %s>" % (self.name, state)
+
+
+class _BatchProxy(object):
+    """Stands in for a manager, queueing method calls instead of running
+    them."""
+
+    def __init__(self, batch, target, name):
+        self._batch = batch
+        self._target = target
+        self._name = name
+
+    def __getattr__(self, name):
+        attr = self._batch._unwrap(getattr(self._target, name))
+        full_name = "%s.%s" % (self._name, name)
+        if not callable(attr):
+            return _BatchProxy(self._batch, attr, full_name)
+
+        def queue(*args, **kwargs):
+            return self._batch.add(full_name, attr, *args, **kwargs)
+        queue.__name__ = name
+        queue.__doc__ = attr.__doc__
+        return queue
+
+
+class Batch(object):
+    """
+    Queues manager calls and runs them on a bounded pool of threads.
+
+    Use it through :meth:`Dbaas.batch`::
+
+        >>> with red.batch(max_concurrency=10) as batch:
+        ...     for instance_id in instance_ids:
+        ...         batch.instances.get(instance_id)
+        ...         batch.mgmt.instances.show(instance_id)
+        >>> for result in batch.results:
+        ...     if result.failed:
+        ...         print result.name, result.exception
+        ...     else:
+        ...         print result.value.id
+
+    Calls are queued while the block runs, and run when it exits. Each queued
+    call returns its :class:`BatchResult`, and ``results`` keeps them in the
+    order the calls were made. A failing call does not stop the others. If
+    the block itself raises, nothing is run.
+    """
+
+    def __init__(self, dbaas, max_concurrency=None):
+        if max_concurrency is None:
+            max_concurrency = DEFAULT_MAX_CONCURRENCY
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.dbaas = dbaas
+        self.max_concurrency = max_concurrency
+        self.results = []
+        self._calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _BatchProxy(self, self._unwrap(getattr(self.dbaas, name)),
+                           name)
+
+    def _unwrap(self, target):
+        """Returns what calls on ``target`` should be run against."""
+        return target
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+
+    @property
+    def failures(self):
+        """The results of the calls which raised, in call order."""
+        return [result for result in self.results if result.failed]
+
+    def add(self, name, func, *args, **kwargs):
+        """Queues ``func(*args, **kwargs)`` and returns its BatchResult."""
+        result = BatchResult(name, args, kwargs)
+        self.results.append(result)
+        self._calls.append((result, func))
+        return result
+
+    def run(self):
+        """Runs every queued call and waits for all of them to finish."""
+        calls, self._calls = self._calls, []
+        if not calls:
+            return self.results
+        work = Queue.Queue()
+        for call in calls:
+            work.put(call)
+
+        def worker():
+            while True:
+                try:
+                    result, func = work.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    result.value = func(*result.args, **result.kwargs)
+                except Exception, ex:
+                    result.exception = ex
+                    result.exc_info = sys.exc_info()
+                result.done = True
+
+        self._run_workers(worker, min(self.max_concurrency, len(calls)))
+        return self.results
+
+    def _run_workers(self, worker, count):
+        """Runs ``worker`` on ``count`` threads and waits for them."""
+        workers = [threading.Thread(target=worker) for i in range(count)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            thread.join()
@@ -0,0 +1,113 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Conditional GET support for the HTTP client.
+"""
+
+import itertools
+import threading
+
+
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class CacheEntry(object):
+    """The validators and parsed body of one cached GET response."""
+
+    def __init__(self, etag, last_modified, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+
+    def conditional_headers(self):
+        """Headers which ask the server for a 304 if nothing changed."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    """
+    Remembers the ETag/Last-Modified and parsed body of GET responses.
+
+    The client sends the stored validators with the next GET of the same
+    URL, and on a 304 Not Modified hands back the stored body instead of
+    downloading and parsing it again. Bodies are shared between callers, so
+    they must be treated as read only.
+
+    Keys include the auth scope (user and tenant) so clients for different
+    accounts can share one cache. Once ``max_entries`` is reached the least
+    recently used entry is dropped.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # {key: [last_used, CacheEntry]}
+        self._clock = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the CacheEntry for ``key``, or None."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            item[0] = self._clock.next()
+            return item[1]
+
+    def store(self, key, resp, body):
+        """Remembers ``body`` if the response carries a validator."""
+        etag = resp.get('etag')
+        last_modified = resp.get('last-modified')
+        if not etag and not last_modified:
+            self.invalidate(key)
+            return
+        entry = CacheEntry(etag, last_modified, body)
+        with self._lock:
+            if key not in self._entries and \
+                    len(self._entries) >= self.max_entries:
+                oldest = min(self._entries.iteritems(),
+                             key=lambda item: item[1][0])[0]
+                del self._entries[oldest]
+            self._entries[key] = [self._clock.next(), entry]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def response_body(self, key, entry, resp, body):
+        """Returns the body to hand back for a GET made with ``entry``'s
+        validators, updating the cache from the response."""
+        if entry is not None and resp.status == 304:
+            with self._lock:
+                self.hits += 1
+            return entry.body
+        with self._lock:
+            self.misses += 1
+        if resp.status == 200:
+            self.store(key, resp, body)
+        return body
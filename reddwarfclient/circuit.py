@@ -0,0 +1,102 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Circuit breaking for service endpoints.
+"""
+
+import threading
+import time
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit(object):
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+
+class CircuitBreaker(object):
+    """
+    Tracks consecutive failures per endpoint and stops calling bad ones.
+
+    After ``failure_threshold`` failures in a row (connection errors,
+    timeouts or 5xx responses) an endpoint's circuit opens and requests to
+    it fail at once instead of waiting on a hung server. Once ``cooldown``
+    seconds have passed a single request is let through as a probe: if it
+    works the circuit closes, otherwise it opens for another cooldown.
+
+    One breaker may be shared by several clients.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = _Circuit()
+        return circuit
+
+    def state(self, endpoint):
+        with self._lock:
+            return self._circuit(endpoint).state
+
+    def allow(self, endpoint, now=None):
+        """True if a request may be sent to ``endpoint`` now."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == CLOSED:
+                return True
+            if circuit.state == OPEN:
+                if now - circuit.opened_at < self.cooldown:
+                    return False
+                circuit.state = HALF_OPEN
+                circuit.probing = False
+            # Half open: let exactly one probe through.
+            if circuit.probing:
+                return False
+            circuit.probing = True
+            return True
+
+    def record_success(self, endpoint):
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.probing = False
+
+    def record_failure(self, endpoint, now=None):
+        if now is None:
+            now = time.time()
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            circuit.failures += 1
+            circuit.probing = False
+            if (circuit.state == HALF_OPEN or
+                    circuit.failures >= self.failure_threshold):
+                circuit.state = OPEN
+                circuit.opened_at = now
@@ -13,17 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import gzip
 import httplib2
 import logging
 import os
+import random
+import re
+import StringIO
+import sys
+import threading
 import time
 import urlparse
-import sys
-
-try:
-    import json
-except ImportError:
-    import simplejson as json
 
 # Python 2.5 compat fix
 if not hasattr(urlparse, 'parse_qsl'):
@@ -31,12 +32,72 @@ if not hasattr(urlparse, 'parse_qsl'):
     urlparse.parse_qsl = cgi.parse_qsl
 
 from reddwarfclient import auth
+from reddwarfclient import codec
 from reddwarfclient import exceptions
+from reddwarfclient import sessions
+from reddwarfclient import tracing
+from reddwarfclient.batch import Batch
+from reddwarfclient.metrics import route_template
+from reddwarfclient.pool import ConnectionPool
+from reddwarfclient.pool import DNSCache
+from reddwarfclient.pool import build_connection_types
+from reddwarfclient.pool import conn_key_for
+from reddwarfclient.pool import split_conn_key
+from reddwarfclient.retry import IDEMPOTENT_METHODS
+from reddwarfclient.retry import parse_retry_after
+from reddwarfclient.timings import DEFAULT_MAX_TIMINGS
+from reddwarfclient.timings import Timing
+from reddwarfclient.timings import TimingLog
 
 
 _logger = logging.getLogger(__name__)
 RDC_PP = os.environ.get("RDC_PP", "False") == "True"
 
+# Connections to the service Dbaas(prewarm=True) leaves in the pool.
+DEFAULT_PREWARM_CONNECTIONS = 2
+
+REDACTED = '***'
+REDACTED_HEADERS = ('x-auth-token', 'x-auth-key', 'x-storage-token',
+                    'authorization')
+# Credentials in auth requests and responses, JSON or XML. The value is
+# matched without its closing quote so a body cut short is still redacted.
+REDACTED_PATTERNS = [
+    re.compile(r'("(?:password|apiKey|key)"\s*:\s*")[^"]*'),
+    re.compile(r'("token"\s*:\s*\{[^{}]*?"id"\s*:\s*")[^"]*'),
+    re.compile(r'(\b(?:password|apiKey|key)=")[^"]*'),
+    re.compile(r'(<token\b[^>]*?\bid=")[^"]*'),
+]
+
+
+def _redact_tokens(value):
+    """Blanks out the id of every token in a decoded JSON body, however
+    deeply nested, which REDACTED_PATTERNS cannot do. Returns True if there
+    were any."""
+    found = False
+    if isinstance(value, dict):
+        token = value.get('token')
+        if isinstance(token, dict) and 'id' in token:
+            token['id'] = REDACTED
+            found = True
+        for item in value.itervalues():
+            found = _redact_tokens(item) or found
+    elif isinstance(value, list):
+        for item in value:
+            found = _redact_tokens(item) or found
+    return found
+
+
+class _Lazy(object):
+    """Formats a log argument only if the message is actually emitted."""
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
 
 def log_to_streamhandler(stream=None):
     stream = stream or sys.stderr
@@ -49,17 +110,100 @@ if 'REDDWARFCLIENT_DEBUG' in os.environ and os.environ['REDDWARFCLIENT_DEBUG']:
     log_to_streamhandler()
 
 
+def _shared(name):
+    """A client attribute which is kept in the client's AuthSession."""
+    def get(self):
+        return getattr(self.session, name)
+
+    def set(self, value):
+        setattr(self.session, name, value)
+    return property(get, set)
+
+
+def call_later(delay, func):
+    """Calls ``func`` on a daemon thread after ``delay`` seconds."""
+    timer = threading.Timer(delay, func)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
 class ReddwarfHTTPClient(httplib2.Http):
+    """HTTP client for the Reddwarf API.
+
+    A single client may be shared by many threads. State that belongs to one
+    request (httplib2's connections, ``last_response`` and the redirect
+    setting) is kept per thread, the token and service URL are swapped
+    together under a lock, and connections come from a thread-safe pool.
+
+    The token, service URL and catalog live in ``session``, a
+    sessions.AuthSession which other clients may share; see Dbaas.
+    """
 
     USER_AGENT = 'python-reddwarfclient'
 
+    # The codec.JSONCodec used to encode requests and decode responses.
+    json_codec = codec.default()
+
+    # Response encodings offered to the server; httplib2 decodes them before
+    # morph_response_body sees the body. None asks for "identity", as
+    # httplib2 offers gzip and deflate itself when there is no header.
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+    # With compress_requests on, bodies at least this large are gzipped.
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_LEVEL = 6
+
+    # Debug logging of traffic. Only this fraction of requests is logged,
+    # though errors always are, and bodies are cut to LOG_BODY_LIMIT bytes.
+    LOG_SAMPLE_RATE = float(os.environ.get('REDDWARFCLIENT_DEBUG_SAMPLE', 1))
+    LOG_BODY_LIMIT = int(os.environ.get('REDDWARFCLIENT_DEBUG_MAX_BODY',
+                                        4096))
+
+    # With auto_refresh, the token is replaced this many seconds before it
+    # expires, or halfway through its life if that comes later, as it does
+    # for tokens good for less than twice as long. A failed refresh is
+    # tried again after REFRESH_RETRY seconds.
+    REFRESH_MARGIN = 300
+    REFRESH_RETRY = 30
+
+    # The lifecycle hooks which may be registered with add_hook().
+    HOOK_TYPES = ('before_request', 'after_response', 'on_retry', 'on_auth',
+                  'on_error')
+
     def __init__(self, user, password, tenant, auth_url, service_name,
                  service_url=None,
                  auth_strategy=None, insecure=False,
                  timeout=None, proxy_tenant_id=None,
                  proxy_token=None, region_name=None,
                  endpoint_type='publicURL', service_type=None,
-                 timings=False, options=None, args=None):
+                 timings=False, options=None, args=None, pool=None,
+                 compress_requests=False, response_cache=None,
+                 retry_policy=None, rate_limiter=None, circuit_breaker=None,
+                 failover=False, lean=False, max_timings=None,
+                 metrics=None, tracer=None, token_cache=None,
+                 auto_refresh=False, session=None):
+
+        # The login state, which is this client's alone unless a session
+        # shared with other clients is given.
+        if session is None:
+            session = sessions.AuthSession(service_url=service_url)
+        if session.pool is None:
+            # Idle keep-alive connections for the auth and service endpoints.
+            session.pool = pool or ConnectionPool()
+        elif pool is not None and pool is not session.pool:
+            _logger.warning("Ignoring the connection pool given; the shared "
+                            "session already has one.")
+        self.session = session
+        self.pool = session.pool
+
+        # Per-thread request state; see the connections property.
+        self._local = threading.local()
+        self._times_lock = threading.Lock()
+        # {hook type: (func, ...)}, replaced rather than changed so requests
+        # can run the hooks without taking the lock.
+        self._hooks = {}
+        self._hooks_lock = threading.Lock()
 
         super(ReddwarfHTTPClient, self).__init__(timeout=timeout)
 
@@ -72,23 +216,66 @@ class ReddwarfHTTPClient(httplib2.Http):
             self.auth_url = None
         self.region_name = region_name
         self.endpoint_type = endpoint_type
-        self.service_url = service_url
         self.service_type = service_type
         self.service_name = service_name
         self.timings = timings
 
-        self.times = []  # [("item", starttime, endtime), ...]
+        # [("item", starttime, endtime), ...]. With max_timings, or in lean
+        # mode, only the most recent are kept.
+        if max_timings or lean:
+            self.times = TimingLog(max_timings or DEFAULT_MAX_TIMINGS)
+        else:
+            self.times = []
+
+        # Lean mode does not pin the last response body in memory.
+        self.keep_last_response = not lean
 
-        self.auth_token = None
         self.proxy_token = proxy_token
         self.proxy_tenant_id = proxy_tenant_id
         self.options = options
         self.args = args
 
+        # Only turn this on for servers which accept gzipped bodies.
+        self.compress_requests = compress_requests
+
+        # Optional cache.ResponseCache used for conditional GETs.
+        self.response_cache = response_cache
+
+        # Optional retry.RetryPolicy; without one, only a 401 is retried.
+        self.retry_policy = retry_policy
+        # Optional ratelimit.RateLimiter pacing requests to the service.
+        self.rate_limiter = rate_limiter
+
+        # Optional circuit.CircuitBreaker for the service endpoints. With
+        # failover, idempotent requests move on to the other endpoints the
+        # service catalog lists for the service while one is failing.
+        self.circuit_breaker = circuit_breaker
+        self.failover = failover
+
+        # Optional metrics.RequestMetrics recording every request by route.
+        self.metrics = metrics
+        # Optional tracing.Tracer given spans for requests, parsing and auth.
+        self.tracer = tracer
+        # Optional tokencache.TokenCache consulted before logging in.
+        self.token_cache = token_cache
+        # Log in again in the background shortly before the token expires,
+        # so requests never wait for a 401 and a new login.
+        self.auto_refresh = auto_refresh
+
+        # Used to wait between retries and for the rate limiter, and to
+        # schedule token refreshes; AsyncDbaas makes these green.
+        self.sleep = time.sleep
+        self.call_later = call_later
+
         # httplib2 overrides
         self.force_exception_to_status_code = True
         self.disable_ssl_certificate_validation = insecure
 
+        # Traffic is logged through a hook, so there is no cost to it unless
+        # debug logging was on when the client was made.
+        if _logger.isEnabledFor(logging.DEBUG):
+            self.add_hook('after_response', self.http_log)
+
         auth_cls = auth.get_authenticator_cls(auth_strategy)
 
         self.authenticator = auth_cls(self, auth_strategy,
@@ -101,39 +288,155 @@ class ReddwarfHTTPClient(httplib2.Http):
                                       options=self.options,
                                       args=self.args)
 
+    auth_token = _shared('auth_token')
+    service_url = _shared('service_url')
+    # When auth_token expires, if the auth service said.
+    token_expires = _shared('token_expires')
+    catalog = _shared('catalog')
+    failover_urls = _shared('failover_urls')
+    auth_stats = _shared('stats')
+    _auth_lock = _shared('lock')
+    # Held while logging in for want of a good token, so that threads which
+    # need to at the same time share one login; see _login().
+    _login_lock = _shared('login_lock')
+    _login_flights = _shared('login_flights')
+    _login_error = _shared('login_error')
+    _refresh_generation = _shared('refresh_generation')
+    _refresh_timer = _shared('refresh_timer')
+
+    @property
+    def connections(self):
+        """The connections httplib2 is using for the current thread."""
+        try:
+            return self._local.connections
+        except AttributeError:
+            self._local.connections = {}
+            return self._local.connections
+
+    @connections.setter
+    def connections(self, value):
+        self._local.connections = value
+
+    @property
+    def last_response(self):
+        """The (resp, body) of the last request made by this thread."""
+        return getattr(self._local, 'last_response', None)
+
+    @last_response.setter
+    def last_response(self, value):
+        self._local.last_response = value
+
+    @property
+    def follow_all_redirects(self):
+        override = getattr(self._local, 'follow_all_redirects', None)
+        if override is not None:
+            return override
+        return self._follow_all_redirects
+
+    @follow_all_redirects.setter
+    def follow_all_redirects(self, value):
+        self._follow_all_redirects = value
+
     def get_timings(self):
         return self.times
 
-    def http_log(self, args, kwargs, resp, body):
+    def add_hook(self, hook_type, hook_func):
+        """Calls ``hook_func`` with keyword arguments at a point in the life
+        of every request this client makes:
+
+        before_request(method, url, headers, body)
+            Before sending; ``body`` is the encoded request body or None.
+            The headers may be changed.
+        after_response(method, url, headers, body, resp, response_body,
+                       elapsed, bytes_out, bytes_in, timing)
+            After any response, including errors, before it is parsed.
+            ``elapsed`` is in seconds and ``bytes_out`` counts the bytes
+            sent, after compression. ``timing`` breaks the request down
+            into connection phases, as in get_timings(), or is None.
+        on_error(method, url, error, resp, elapsed, transport_error)
+            When the request raises ``error``. ``transport_error`` is the
+            connection level exception behind it, if there was one.
+        on_retry(method, url, attempt, delay, status, error)
+            Before waiting ``delay`` seconds to retry a failed request.
+        on_auth(auth_url, service_url, elapsed)
+            After logging in.
+
+        Hooks should accept **kwargs, as more arguments may be added.
+        """
+        if hook_type not in self.HOOK_TYPES:
+            raise ValueError("Unknown hook type %r." % hook_type)
+        with self._hooks_lock:
+            hooks = dict(self._hooks)
+            hooks[hook_type] = hooks.get(hook_type, ()) + (hook_func,)
+            self._hooks = hooks
+
+    def remove_hook(self, hook_type, hook_func):
+        with self._hooks_lock:
+            hooks = dict(self._hooks)
+            funcs = tuple(func for func in hooks.get(hook_type, ())
+                          if func != hook_func)
+            if funcs:
+                hooks[hook_type] = funcs
+            else:
+                hooks.pop(hook_type, None)
+            self._hooks = hooks
+
+    def run_hooks(self, hook_type, **kwargs):
+        for hook_func in self._hooks.get(hook_type, ()):
+            hook_func(**kwargs)
+
+    def http_log(self, method, url, headers, body, resp, response_body,
+                 **kwargs):
+        """An after_response hook which logs the request as a curl command,
+        and the response."""
+        if not self._log_sampled(resp):
+            return
+        args = (url, method)
+        request = {'headers': headers}
+        if body is not None:
+            request['body'] = body
         if not RDC_PP:
-            self.simple_log(args, kwargs, resp, body)
+            self.simple_log(args, request, resp, response_body)
         else:
-            self.pretty_log(args, kwargs, resp, body)
+            self.pretty_log(args, request, resp, response_body)
 
     def simple_log(self, args, kwargs, resp, body):
         if not _logger.isEnabledFor(logging.DEBUG):
             return
 
-        string_parts = ['curl -i']
-        for element in args:
-            if element in ('GET', 'POST'):
-                string_parts.append(' -X %s' % element)
-            else:
-                string_parts.append(' %s' % element)
-
-        for element in kwargs['headers']:
-            header = ' -H "%s: %s"' % (element, kwargs['headers'][element])
-            string_parts.append(header)
-
-        _logger.debug("REQ: %s\n" % "".join(string_parts))
+        _logger.debug("REQ: %s\n", _Lazy(self._curl_command, args,
+                                         kwargs['headers']))
         if 'body' in kwargs:
-            _logger.debug("REQ BODY: %s\n" % (kwargs['body']))
-        _logger.debug("RESP:%s %s\n", resp, body)
+            _logger.debug("REQ BODY: %s\n", _Lazy(self._log_body,
+                                                  kwargs['body']))
+        _logger.debug("RESP:%s %s\n", _Lazy(self._log_headers, resp),
+                      _Lazy(self._log_body, body))
 
     def pretty_log(self, args, kwargs, resp, body):
         if not _logger.isEnabledFor(logging.DEBUG):
             return
 
+        curl_cmd = _Lazy(self._curl_command, args, kwargs['headers'])
+        _logger.debug("REQUEST:")
+        if 'body' in kwargs:
+            _logger.debug("%s -d '%s'", curl_cmd,
+                          _Lazy(self._log_body, kwargs['body']))
+            _logger.debug("BODY: %s\n", _Lazy(self._log_body, kwargs['body'],
+                                              pretty=True))
+        else:
+            _logger.debug("%s", curl_cmd)
+
+        _logger.debug("RESPONSE HEADERS: %s", _Lazy(self._log_headers, resp))
+        _logger.debug("RESPONSE BODY   : %s",
+                      _Lazy(self._log_body, body, pretty=True))
+
+    def _log_sampled(self, resp):
+        """True if a request should be logged. Errors always are."""
+        if self.LOG_SAMPLE_RATE >= 1 or resp.status >= 400:
+            return True
+        return random.random() < self.LOG_SAMPLE_RATE
+
+    def _curl_command(self, args, headers):
         string_parts = ['curl -i']
         for element in args:
             if element in ('GET', 'POST'):
@@ -141,48 +444,126 @@ class ReddwarfHTTPClient(httplib2.Http):
             else:
                 string_parts.append(' %s' % element)
 
-        for element in kwargs['headers']:
-            header = ' -H "%s: %s"' % (element, kwargs['headers'][element])
-            string_parts.append(header)
-
-        curl_cmd = "".join(string_parts)
-        _logger.debug("REQUEST:")
-        if 'body' in kwargs:
-            _logger.debug("%s -d '%s'" % (curl_cmd, kwargs['body']))
-            try:
-                req_body = json.dumps(json.loads(kwargs['body']),
-                                      sort_keys=True, indent=4)
-            except:
-                req_body = kwargs['body']
-            _logger.debug("BODY: %s\n" % (req_body))
+        for name, value in self._log_headers(headers).items():
+            string_parts.append(' -H "%s: %s"' % (name, value))
+        return "".join(string_parts)
+
+    def _log_headers(self, headers):
+        """Returns a copy of ``headers`` with credentials blanked out."""
+        headers = dict(headers)
+        for name in headers:
+            if name.lower() in REDACTED_HEADERS:
+                headers[name] = REDACTED
+        return headers
+
+    def _log_body(self, body, pretty=False):
+        """Returns a body fit for the log: pretty printed if asked for and
+        small, cut to LOG_BODY_LIMIT bytes and with credentials removed."""
+        if body is None:
+            return ''
+        size = len(body)
+        if size > self.LOG_BODY_LIMIT:
+            # Too big to be worth decoding; the patterns redact what is left.
+            body = body[:self.LOG_BODY_LIMIT]
         else:
-            _logger.debug(curl_cmd)
-
-        try:
-            resp_body = json.dumps(json.loads(body), sort_keys=True, indent=4)
-        except:
-            resp_body = body
-        _logger.debug("RESPONSE HEADERS: %s" % resp)
-        _logger.debug("RESPONSE BODY   : %s" % resp_body)
+            try:
+                value = self.json_codec.loads(body)
+            except Exception:
+                pass
+            else:
+                if _redact_tokens(value):
+                    body = self.json_codec.dumps(value)
+                if pretty:
+                    body = self.json_codec.pretty(value)
+        body = self._redact(body)
+        if size > self.LOG_BODY_LIMIT:
+            body += '... (%d bytes)' % size
+        return body
+
+    def _redact(self, text):
+        for pattern in REDACTED_PATTERNS:
+            text = pattern.sub(r'\1' + REDACTED, text)
+        for secret in (self.auth_token, self.proxy_token):
+            # Real tokens are long; blanking out a short test token would
+            # mangle the rest of the message.
+            if isinstance(secret, basestring) and len(secret) >= 8:
+                text = text.replace(secret, REDACTED)
+        return text
 
     def request(self, *args, **kwargs):
         kwargs.setdefault('headers', kwargs.get('headers', {}))
         kwargs['headers']['User-Agent'] = self.USER_AGENT
+        kwargs['headers']['Accept-Encoding'] = \
+            self.ACCEPT_ENCODING or 'identity'
+        follow_all_redirects = kwargs.pop('follow_all_redirects', None)
+        # parse=False returns successful bodies as the raw string.
+        parse = kwargs.pop('parse', True)
         self.morph_request(kwargs)
 
-        resp, body = super(ReddwarfHTTPClient, self).request(*args, **kwargs)
+        hooks = self._hooks
+        if hooks:
+            self.run_hooks('before_request', method=args[1], url=args[0],
+                           headers=kwargs['headers'],
+                           body=kwargs.get('body'))
+        sent = self.compress_request(kwargs)
+        self._local.transport_error = None
+        self._local.connection_timing = None
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.request_started()
+        start_time = time.time()
+        with tracing.span(self.tracer, 'http', method=args[1],
+                          url=args[0]) as span:
+            try:
+                with self._redirects_for_request(follow_all_redirects):
+                    resp, body = self._pooled_request(*args, **sent)
+            finally:
+                if metrics is not None:
+                    metrics.request_finished()
+            span.set('status', resp.status)
+        if metrics is not None:
+            self._record_metrics(metrics, args[0], args[1], sent, resp, body,
+                                 start_time)
 
         # Save this in case anyone wants it.
-        self.last_response = (resp, body)
-        self.http_log(args, kwargs, resp, body)
+        if self.keep_last_response:
+            self.last_response = (resp, body)
+
+        if not hooks:
+            return self._response(resp, body, parse)
+        elapsed = time.time() - start_time
+        self.run_hooks('after_response', method=args[1], url=args[0],
+                       headers=kwargs['headers'], body=kwargs.get('body'),
+                       resp=resp, response_body=body, elapsed=elapsed,
+                       bytes_out=len(sent.get('body') or ''),
+                       bytes_in=len(body or ''),
+                       timing=self._local.connection_timing)
+        try:
+            return self._response(resp, body, parse)
+        except Exception, ex:
+            exc_info = sys.exc_info()
+            self.run_hooks('on_error', method=args[1], url=args[0], error=ex,
+                           resp=resp, elapsed=elapsed,
+                           transport_error=getattr(self._local,
+                                                   'transport_error', None))
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _response(self, resp, body, parse):
+        """Returns (resp, parsed body), or raises the error in the response."""
+        if not parse and resp.status < 400:
+            return resp, body
 
         if body:
             try:
-                body = self.morph_response_body(body)
+                with tracing.span(self.tracer, 'parse', bytes=len(body)):
+                    body = self.morph_response_body(body)
             except exceptions.ResponseFormatError:
-                # Acceptable only if the response status is an error code.
-                # Otherwise its the API or client misbehaving.
-                self.raise_error_from_status(resp, None)
+                # Acceptable only if the response status is an error code,
+                # such as the HTML page of a proxy's 503, which is then
+                # raised by its status so it can be retried. Otherwise its
+                # the API or client misbehaving.
+                if resp.status >= 400:
+                    raise exceptions.from_response(resp, None)
                 raise  # Not accepted!
         else:
             body = None
@@ -192,6 +573,91 @@ class ReddwarfHTTPClient(httplib2.Http):
 
         return resp, body
 
+    @contextlib.contextmanager
+    def _redirects_for_request(self, follow_all_redirects):
+        """Overrides follow_all_redirects for requests made in this thread.
+
+        None keeps the client wide setting.
+        """
+        if follow_all_redirects is None:
+            yield
+            return
+        previous = getattr(self._local, 'follow_all_redirects', None)
+        self._local.follow_all_redirects = follow_all_redirects
+        try:
+            yield
+        finally:
+            self._local.follow_all_redirects = previous
+
+    def _pooled_request(self, uri, *args, **kwargs):
+        """Runs the httplib2 request over a connection from the pool."""
+        try:
+            conn_key = conn_key_for(uri)
+        except httplib2.HttpLib2Error:
+            # Let httplib2 deal with (and report) the malformed URI.
+            return super(ReddwarfHTTPClient, self).request(uri, *args,
+                                                           **kwargs)
+        if conn_key not in self.connections:
+            conn = self.pool.acquire(self._pool_key(conn_key))
+            if conn is not None:
+                # It may have been opened by another client sharing the
+                # pool, with another timeout.
+                conn.timeout = self.timeout
+                if getattr(conn, 'sock', None) is not None:
+                    conn.sock.settimeout(self.timeout)
+                self.connections[conn_key] = conn
+        scheme = conn_key.split(':', 1)[0]
+        kwargs.setdefault('connection_type', self.pool.connection_type(scheme))
+        try:
+            return super(ReddwarfHTTPClient, self).request(uri, *args,
+                                                           **kwargs)
+        finally:
+            self._release_connections()
+
+    def _release_connections(self):
+        """Hands every connection httplib2 opened back to the pool."""
+        while self.connections:
+            conn_key, conn = self.connections.popitem()
+            self.pool.release(self._pool_key(conn_key), conn)
+
+    def _pool_key(self, conn_key):
+        """Returns the key the pool files the connections for ``conn_key``
+        under. HTTPS connections are kept apart by how they check the
+        server's certificate, so a client that validates it never reuses a
+        connection an ``insecure`` client opened."""
+        key = split_conn_key(conn_key)
+        if key[0] == 'https':
+            key += (self.disable_ssl_certificate_validation, self.ca_certs)
+        return key
+
+    def _record_metrics(self, metrics, uri, method, kwargs, resp, body,
+                        start_time):
+        route = route_template(uri, [self.service_url] + self.failover_urls)
+        error = None
+        if getattr(self._local, 'transport_error', None) is not None:
+            error = True
+        metrics.record(method, route, resp.status,
+                       time.time() - start_time,
+                       bytes_out=len(kwargs.get('body') or ''),
+                       bytes_in=len(body or ''), error=error)
+
+    def _conn_request(self, conn, request_uri, method, body, headers):
+        # httplib2 turns transport errors into fake responses; remember the
+        # real exception so retries can tell a reset from a true 400.
+        timed = hasattr(conn, 'start_timing')
+        if timed:
+            conn.start_timing()
+        try:
+            return super(ReddwarfHTTPClient, self)._conn_request(
+                conn, request_uri, method, body, headers)
+        except Exception, ex:
+            self._local.transport_error = ex
+            raise
+        finally:
+            if timed:
+                # Following a redirect, the last exchange is kept.
+                self._local.connection_timing = conn.finish_timing()
+
     def raise_error_from_status(self, resp, body):
         if resp.status in (400, 401, 403, 404, 408, 409, 413, 500, 501):
             raise exceptions.from_response(resp, body)
@@ -200,42 +666,192 @@ class ReddwarfHTTPClient(httplib2.Http):
         kwargs['headers']['Accept'] = 'application/json'
         kwargs['headers']['Content-Type'] = 'application/json'
         if 'body' in kwargs:
-            kwargs['body'] = json.dumps(kwargs['body'])
+            kwargs['body'] = self.json_codec.dumps(kwargs['body'])
 
     def morph_response_body(self, body_string):
         try:
-            return json.loads(body_string)
+            return self.json_codec.loads(body_string)
         except ValueError:
             raise exceptions.ResponseFormatError()
 
+    def iter_response_list(self, body_string, response_key, extras):
+        """Yields the items of the list ``response_key`` in a raw response
+        body one at a time, putting other top level values in ``extras``."""
+        try:
+            for item in self.json_codec.iter_list(body_string, response_key,
+                                                  extras):
+                yield item
+        except ValueError:
+            raise exceptions.ResponseFormatError()
+
+    def compress_request(self, kwargs):
+        """Returns the request kwargs with a large body gzipped.
+
+        The kwargs given are left alone so the plain body can be logged.
+        """
+        body = kwargs.get('body')
+        if (not self.compress_requests or not body or
+                len(body) < self.COMPRESSION_MIN_SIZE):
+            return kwargs
+        compressed = StringIO.StringIO()
+        gzip_file = gzip.GzipFile(fileobj=compressed, mode='wb',
+                                  compresslevel=self.COMPRESSION_LEVEL)
+        gzip_file.write(body)
+        gzip_file.close()
+        kwargs = dict(kwargs)
+        kwargs['headers'] = dict(kwargs['headers'])
+        kwargs['headers']['Content-Encoding'] = 'gzip'
+        kwargs['body'] = compressed.getvalue()
+        return kwargs
+
     def _time_request(self, url, method, **kwargs):
         start_time = time.time()
         resp, body = self.request(url, method, **kwargs)
-        self.times.append(("%s %s" % (method, url),
-                           start_time, time.time()))
+        with self._times_lock:
+            self.times.append(Timing("%s %s" % (method, url), start_time,
+                                     time.time(),
+                                     getattr(self._local, 'connection_timing',
+                                             None)))
         return resp, body
 
     def _cs_request(self, url, method, **kwargs):
-        def request():
-            kwargs.setdefault('headers', {})['X-Auth-Token'] = self.auth_token
+        def request(auth_token, service_url):
+            kwargs.setdefault('headers', {})['X-Auth-Token'] = auth_token
             if self.tenant:
                 kwargs['headers']['X-Auth-Project-Id'] = self.tenant
 
-            resp, body = self._time_request(self.service_url + url, method,
-                                            **kwargs)
-            return resp, body
+            return self._service_request(service_url, url, method, **kwargs)
 
-        if not self.auth_token or not self.service_url:
-            self.authenticate()
-
-        # Perform the request once. If we get a 401 back then it
-        # might be because the auth token expired, so try to
-        # re-authenticate and try again. If it still fails, bail.
+        def authed_request():
+            # Perform the request once. If we get a 401 back then it
+            # might be because the auth token expired, so try to
+            # re-authenticate and try again. If it still fails, bail.
+            auth_token, service_url = self.get_auth_state()
+            try:
+                return request(auth_token, service_url)
+            except exceptions.Unauthorized, ex:
+                # Threads rejected together share a single new login.
+                self._login(auth_token, self._relogin)
+                return request(*self.get_auth_state())
+
+        auth_token, service_url = self.get_auth_state()
+        if not auth_token or not service_url:
+            self._login()
+
+        if self.retry_policy is None:
+            return authed_request()
+        return self._retry(method, authed_request, url=url)
+
+    def _service_request(self, service_url, url, method, **kwargs):
+        """Sends one request to the service, through the circuit breaker."""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._limited_request(service_url, url, method, **kwargs)
+
+        endpoints = [service_url]
+        if self.failover and method in IDEMPOTENT_METHODS:
+            endpoints.extend(endpoint for endpoint in self.failover_urls
+                             if endpoint != service_url)
+        # The outcome of the last endpoint tried, if all of them failed.
+        error = None
+        response = None
+        for endpoint in endpoints:
+            if not breaker.allow(endpoint):
+                continue
+            self._local.transport_error = None
+            try:
+                resp, body = self._limited_request(endpoint, url, method,
+                                                   **kwargs)
+            except exceptions.ClientException, ex:
+                if not self._endpoint_failed(ex.code):
+                    breaker.record_success(endpoint)
+                    raise
+                breaker.record_failure(endpoint)
+                error, response = sys.exc_info(), None
+                continue
+            except Exception:
+                # Such as the HTML page a proxy sends with a 502, which
+                # cannot be parsed. Whatever it was, the probe is over.
+                breaker.record_failure(endpoint)
+                error, response = sys.exc_info(), None
+                continue
+            if not self._endpoint_failed(resp.status):
+                breaker.record_success(endpoint)
+                return resp, body
+            breaker.record_failure(endpoint)
+            error, response = None, (resp, body)
+        if error is not None:
+            raise error[0], error[1], error[2]
+        if response is not None:
+            return response
+        raise exceptions.CircuitOpen(endpoints)
+
+    def _endpoint_failed(self, status):
+        """True if the last request says its endpoint is unhealthy."""
+        if getattr(self._local, 'transport_error', None) is not None:
+            return True
+        return status >= 500 and status != 501
+
+    def _limited_request(self, service_url, url, method, **kwargs):
+        """Sends one request to the service, paced by the rate limiter."""
+        if self.rate_limiter is None:
+            return self._cached_request(service_url, url, method, **kwargs)
+
+        self.rate_limiter.acquire(method, url, sleep=self.sleep)
         try:
-            return request()
-        except exceptions.Unauthorized, ex:
-            self.authenticate()
-            return request()
+            resp, body = self._cached_request(service_url, url, method,
+                                              **kwargs)
+        except exceptions.OverLimit, ex:
+            self.rate_limiter.over_limit(
+                method, url, retry_after=parse_retry_after(ex.retry_after))
+            raise
+        self.rate_limiter.succeeded(method, url)
+        return resp, body
+
+    def _cached_request(self, service_url, url, method, **kwargs):
+        """Sends a request, making GETs conditional if there is a
+        response cache."""
+        if (method != 'GET' or self.response_cache is None or
+                not kwargs.get('parse', True)):
+            return self._time_request(service_url + url, method, **kwargs)
+
+        cache_key = (self.username, self.tenant, service_url + url)
+        entry = self.response_cache.get(cache_key)
+        if entry is not None:
+            kwargs['headers'].update(entry.conditional_headers())
+        resp, body = self._time_request(service_url + url, method, **kwargs)
+        body = self.response_cache.response_body(cache_key, entry,
+                                                 resp, body)
+        return resp, body
+
+    def _retry(self, method, request, url=None):
+        """Calls request() until it works or the retry policy gives up."""
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            self._local.transport_error = None
+            try:
+                resp, body = request()
+            except exceptions.ClientException, ex:
+                status, error = ex.code, self._local.transport_error
+                if not policy.should_retry(method, attempt, status=status,
+                                           error=error):
+                    raise
+                retry_after = parse_retry_after(ex.retry_after)
+            else:
+                status, error = resp.status, None
+                if not policy.should_retry(method, attempt, status=status):
+                    return resp, body
+                retry_after = parse_retry_after(resp.get('retry-after'))
+            delay = policy.delay(attempt, retry_after=retry_after)
+            if self.metrics is not None:
+                self.metrics.record_retry(method, route_template(url or '/'))
+            if self._hooks:
+                self.run_hooks('on_retry', method=method, url=url,
+                               attempt=attempt, delay=delay, status=status,
+                               error=error)
+            self.sleep(delay)
 
     def get(self, url, **kwargs):
         return self._cs_request(url, 'GET', **kwargs)
@@ -258,23 +874,179 @@ class ReddwarfHTTPClient(httplib2.Http):
         service.
 
         """
-        catalog = self.authenticator.authenticate()
-        if self.service_url:
+        start_time = time.time()
+        with tracing.span(self.tracer, 'auth', auth_url=self.auth_url):
+            catalog = self.authenticator.authenticate()
+        with self._auth_lock:
+            self.auth_stats['logins'] += 1
+        if self.metrics is not None:
+            self.metrics.record_auth()
+        self.catalog = catalog
+        # Kept whether or not this client fails over, as clients sharing
+        # its session may.
+        if hasattr(catalog, 'get_urls'):
+            self.failover_urls = catalog.get_urls(self.endpoint_type)
+        if self.get_auth_state()[1]:
             possible_service_url = None
         else:
             if self.endpoint_type == "publicURL":
                 possible_service_url = catalog.get_public_url()
             elif self.endpoint_type == "adminURL":
                 possible_service_url = catalog.get_management_url()
+        get_token_expires = getattr(catalog, 'get_token_expires', None)
+        if get_token_expires is not None:
+            self.token_expires = get_token_expires()
+        else:
+            self.token_expires = None
         self.authenticate_with_token(catalog.get_token(), possible_service_url)
+        if self.auto_refresh and self.token_expires is not None:
+            remaining = self.token_expires - time.time()
+            self._schedule_refresh(max(remaining - self.REFRESH_MARGIN,
+                                       remaining / 2.0, 1))
+        if self._hooks:
+            self.run_hooks('on_auth', auth_url=self.auth_url,
+                           service_url=self.get_auth_state()[1],
+                           elapsed=time.time() - start_time)
+
+    def _login(self, stale_token=None, login=None):
+        """Logs in once for all the threads which need to at the same time.
+
+        The first thread calls ``login`` (authenticate by default). Threads
+        which arrive while it is at it wait, then share its outcome: they
+        return once it has a new token, or raise the exception it raised.
+        Nothing is done if the token is already good, meaning it is set
+        and is not ``stale_token``, the one the caller found wanting.
+        """
+        flights = self._login_flights
+        with self._login_lock:
+            if self._login_flights != flights:
+                self.auth_stats['shared'] += 1
+                if self.metrics is not None:
+                    self.metrics.record_auth_shared()
+                if self._login_error is not None:
+                    error = self._login_error
+                    raise error[0], error[1], error[2]
+                return
+            auth_token, service_url = self.get_auth_state()
+            if auth_token and service_url and auth_token != stale_token:
+                return
+            try:
+                (login or self.authenticate)()
+                self._login_error = None
+            except Exception:
+                self._login_error = sys.exc_info()
+                self.auth_stats['failures'] += 1
+                if self.metrics is not None:
+                    self.metrics.record_auth_failure()
+                raise
+            finally:
+                self._login_flights += 1
+
+    def _relogin(self):
+        """Logs in afresh after the service rejected the token."""
+        self.authenticator.forget_token()
+        self.authenticate()
+
+    def get_auth_stats(self):
+        """Returns how many times the client logged in, how many threads
+        shared another's login instead, and how many logins failed."""
+        return dict(self.auth_stats)
+
+    def prewarm(self, url, connections=1):
+        """Opens ``connections`` connections to the host of ``url`` and
+        leaves them idle in the pool, so the requests that use them do not
+        wait for DNS, TCP or TLS. Returns the number opened."""
+        conn_key = conn_key_for(url)
+        scheme, authority = conn_key.split(':', 1)
+        if hasattr(self, '_get_proxy_info'):
+            proxy_info = self._get_proxy_info(scheme, authority)
+        else:
+            proxy_info = self.proxy_info
+        kwargs = {'timeout': self.timeout, 'proxy_info': proxy_info}
+        if scheme == 'https':
+            kwargs['ca_certs'] = self.ca_certs
+            kwargs['disable_ssl_certificate_validation'] = \
+                self.disable_ssl_certificate_validation
+        factory = self.pool.connection_type(scheme)
+        opened = []
+        try:
+            for i in range(connections):
+                conn = factory(authority, **kwargs)
+                conn.connect()
+                opened.append(conn)
+        finally:
+            for conn in opened:
+                self.pool.release(self._pool_key(conn_key), conn)
+        return len(opened)
+
+    def warm_up(self, connections=1):
+        """Gets ready for the first request: connects to the auth service,
+        logs in and opens ``connections`` connections to the service."""
+        if self.auth_url:
+            self.prewarm(self.auth_url)
+        self._login()
+        self.prewarm(self.get_auth_state()[1], connections)
+
+    def _schedule_refresh(self, delay):
+        """Refreshes the token in ``delay`` seconds. This replaces any
+        refresh scheduled earlier."""
+        with self._auth_lock:
+            self._refresh_generation += 1
+            generation = self._refresh_generation
+
+        def refresh():
+            if self.auto_refresh and generation == self._refresh_generation:
+                self.refresh_token()
+        timer = self.call_later(delay, refresh)
+        with self._auth_lock:
+            if generation == self._refresh_generation:
+                self._refresh_timer = timer
+
+    def stop_refresh(self):
+        """Turns auto_refresh off and cancels the refresh scheduled, if any.
+
+        Call this when done with a client made with auto_refresh: its
+        timer otherwise keeps it alive, logging in again before every
+        expiry for as long as the process runs.
+        """
+        self.auto_refresh = False
+        with self._auth_lock:
+            self._refresh_generation += 1
+            timer, self._refresh_timer = self._refresh_timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def refresh_token(self):
+        """Logs in again, swapping in a new token while the old one is still
+        good. Requests already sent carry on with the old token."""
+        expiring = self.get_auth_state()[0]
+
+        def replace():
+            self.authenticate()
+            if self.get_auth_state()[0] == expiring:
+                # The token cache handed back the token being replaced.
+                self._relogin()
+        try:
+            self._login(expiring, replace)
+        except Exception, ex:
+            _logger.warning("Could not refresh the auth token: %s", ex)
+            if (self.token_expires is not None and
+                    self.token_expires > time.time() + self.REFRESH_RETRY):
+                self._schedule_refresh(self.REFRESH_RETRY)
 
     def authenticate_with_token(self, token, service_url=None):
-        self.auth_token = token
-        if not self.service_url:
-            if not service_url:
-                raise exceptions.ServiceUrlNotGiven()
-            else:
-                self.service_url = service_url
+        with self._auth_lock:
+            self.auth_token = token
+            if not self.service_url:
+                if not service_url:
+                    raise exceptions.ServiceUrlNotGiven()
+                else:
+                    self.service_url = service_url
+
+    def get_auth_state(self):
+        """Returns the (auth_token, service_url) pair as one snapshot."""
+        with self._auth_lock:
+            return self.auth_token, self.service_url
 
 
 class Dbaas(object):
@@ -294,14 +1066,43 @@ class Dbaas(object):
         ...
 
     &c.
+
+    Dbaas objects made with ``shared_session`` for the same account, auth
+    URL, region and service share one token, catalog and connection pool
+    for the life of the process, so making one per web request costs no
+    login. Each keeps its own settings, such as ``timeout``.
+
+    ``response_cache``, ``retry_policy``, ``rate_limiter``,
+    ``circuit_breaker`` and ``metrics`` are handed to the client; see
+    ReddwarfHTTPClient.
     """
 
     def __init__(self, username, api_key, tenant=None, auth_url=None,
                  service_type='reddwarf', service_name='Reddwarf',
                  service_url=None, insecure=False, auth_strategy='keystone',
                  region_name=None, client_cls=ReddwarfHTTPClient,
-                 options=None, args=None):
-        
+                 options=None, args=None, pool=None, lean=False,
+                 max_timings=None, tracer=None, prewarm=False,
+                 prewarm_connections=DEFAULT_PREWARM_CONNECTIONS,
+                 token_cache=None, auto_refresh=False, timeout=None,
+                 shared_session=False, response_cache=None,
+                 retry_policy=None, rate_limiter=None, circuit_breaker=None,
+                 metrics=None):
+
+        session = None
+        if shared_session:
+            key = sessions.session_key(username, api_key, tenant, auth_url,
+                                       region_name, dbaas_cls=type(self),
+                                       auth_strategy=auth_strategy,
+                                       service_type=service_type,
+                                       service_name=service_name,
+                                       service_url=service_url,
+                                       insecure=insecure)
+            session = sessions.registry.get(
+                key, lambda: sessions.AuthSession(service_url=service_url))
+        if pool is None and (session is None or session.pool is None):
+            pool = self._default_pool()
+
         self.client = client_cls(username, api_key, tenant, auth_url,
                                  service_type=service_type,
                                  service_name=service_name,
@@ -310,10 +1111,27 @@ class Dbaas(object):
                                  auth_strategy=auth_strategy,
                                  region_name=region_name,
                                  options=options,
-                                 args=args)
-        
+                                 args=args,
+                                 pool=pool,
+                                 lean=lean,
+                                 max_timings=max_timings,
+                                 tracer=tracer,
+                                 token_cache=token_cache,
+                                 auto_refresh=auto_refresh,
+                                 timeout=timeout,
+                                 session=session,
+                                 response_cache=response_cache,
+                                 retry_policy=retry_policy,
+                                 rate_limiter=rate_limiter,
+                                 circuit_breaker=circuit_breaker,
+                                 metrics=metrics)
+
         from reddwarfclient.commands import resources
         resources.load(self)
+        if tracer is not None:
+            for name in resources.names():
+                setattr(self, name,
+                        tracing.TracedManager(getattr(self, name), tracer))
 
         class Mgmt(object):
             def __init__(self, dbaas):
@@ -324,12 +1142,82 @@ class Dbaas(object):
 
         self.mgmt = Mgmt(self)
 
+        if prewarm:
+            self.prewarm(prewarm_connections)
+
+    def prewarm(self, connections=DEFAULT_PREWARM_CONNECTIONS):
+        """
+        Gets the client ready for its first call in the background.
+
+        Host names are resolved and cached, a connection is opened to the
+        auth service, the client logs in and ``connections`` connections to
+        the service are opened and left in the pool. Calls made meanwhile
+        wait for the login rather than logging in again. Returns the thread
+        doing the work. Failures are logged; the calls which follow will
+        run into them again.
+        """
+        if self.client.pool.dns_cache is None:
+            self.client.pool.dns_cache = DNSCache()
+
+        def warm_up():
+            try:
+                self.client.warm_up(connections)
+            except Exception, ex:
+                _logger.warning("Could not prewarm the client: %s", ex)
+        return self._spawn(warm_up)
+
+    def _default_pool(self):
+        """The pool to use when neither the caller nor the shared session
+        has one; None lets the client make a plain one."""
+        return None
+
+    def _spawn(self, func):
+        thread = threading.Thread(target=func)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop_refresh(self):
+        """
+        Stops refreshing the token in the background.
+
+        A Dbaas made with ``auto_refresh`` should have this called once it
+        is no longer needed, or its refresh timer keeps it alive and
+        logging in for as long as the process runs.
+        """
+        self.client.stop_refresh()
+
     def set_management_url(self, url):
         self.client.management_url = url
 
     def get_timings(self):
+        """
+        Returns the ("METHOD url", start, end) of the requests made.
+
+        Each is a :class:`Timing` whose ``phases`` break the request down
+        into DNS resolution, connect, TLS handshake, request write, time to
+        first byte and body read, and say if a pooled connection was
+        reused. This is a list of every request, or a :class:`TimingLog` of the
+        most recent ones if the client was made with ``lean`` or
+        ``max_timings``.
+        """
         return self.client.get_timings()
 
+    def batch(self, max_concurrency=None):
+        """
+        Returns a context which runs manager calls concurrently.
+
+        Calls made on the managers of the returned :class:`Batch` are
+        queued and run on up to ``max_concurrency`` threads sharing this
+        client when the block exits (10 threads unless told otherwise)::
+
+            >>> with red.batch(max_concurrency=10) as calls:
+            ...     for instance_id in instance_ids:
+            ...         calls.management.show(instance_id)
+            >>> [result.value for result in calls.results]
+        """
+        return Batch(self, max_concurrency=max_concurrency)
+
     def authenticate(self):
         """
         Authenticate against the server.
@@ -340,3 +1228,139 @@ class Dbaas(object):
         credentials are wrong.
         """
         self.client.authenticate()
+
+
+class AsyncManager(object):
+    """
+    Wraps a manager so its methods run on green threads.
+
+    Calling any method, including ``_action``, spawns it on the green pool
+    and returns the ``eventlet.greenthread.GreenThread`` at once. ``wait()``
+    on it returns the result or raises the same exception the blocking call
+    would have. Attributes which are not methods are passed through.
+    """
+
+    def __init__(self, manager, green_pool):
+        self.manager = manager
+        self.green_pool = green_pool
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+        if not callable(attr):
+            return attr
+
+        def spawn(*args, **kwargs):
+            return self.green_pool.spawn(attr, *args, **kwargs)
+        spawn.__name__ = name
+        spawn.__doc__ = attr.__doc__
+        return spawn
+
+    def __repr__(self):
+        return "<AsyncManager %r>" % self.manager
+
+
+class GreenBatch(Batch):
+    """
+    A Batch for AsyncDbaas, run on the green threads of its pool.
+
+    The queued calls go to the blocking managers the AsyncManagers wrap, so
+    each call's result is its value rather than a green thread.
+    """
+
+    def _unwrap(self, target):
+        if isinstance(target, AsyncManager):
+            return target.manager
+        return target
+
+    def _run_workers(self, worker, count):
+        workers = [self.dbaas.green_pool.spawn(worker) for i in range(count)]
+        for thread in workers:
+            thread.wait()
+
+
+class AsyncDbaas(Dbaas):
+    """
+    A Dbaas whose managers are driven by a single eventlet hub.
+
+    Requests go over green sockets, so thousands of calls can be in flight
+    from one OS thread. Each manager method returns a green thread::
+
+        >>> red = AsyncDbaas(USERNAME, API_KEY, TENANT, AUTH_URL)
+        >>> pending = [red.instances.get(id) for id in instance_ids]
+        >>> instances = [thread.wait() for thread in pending]
+
+    Resources returned by those calls still use the blocking managers, which
+    is safe because the transport underneath them is green. The JSON and XML
+    client classes, as well as the error mapping, are the same as Dbaas.
+
+    ``max_concurrency`` bounds the number of calls running at once, and is
+    also the number of idle connections kept per host. Requires eventlet.
+    """
+
+    DEFAULT_MAX_CONCURRENCY = 100
+
+    def __init__(self, *args, **kwargs):
+        try:
+            import eventlet
+            from eventlet import corolocal
+            from eventlet import semaphore
+        except ImportError:
+            raise ImportError("AsyncDbaas requires eventlet.")
+
+        max_concurrency = kwargs.pop('max_concurrency',
+                                     self.DEFAULT_MAX_CONCURRENCY)
+        # Read by _default_pool() while the client is made.
+        self._max_concurrency = max_concurrency
+        # Warming up has to wait until the client is made green.
+        prewarm = kwargs.pop('prewarm', False)
+        prewarm_connections = kwargs.pop('prewarm_connections',
+                                         DEFAULT_PREWARM_CONNECTIONS)
+        super(AsyncDbaas, self).__init__(*args, **kwargs)
+
+        # Per-request state must be local to each green thread rather than
+        # to the OS thread they all share.
+        self.client._local = corolocal.local()
+        self.client.sleep = eventlet.sleep
+        self.client.call_later = eventlet.spawn_after
+        if not isinstance(self.client._login_lock, semaphore.Semaphore):
+            # A shared session may have been made green already.
+            self.client._login_lock = semaphore.Semaphore()
+        if self.client.tracer is not None:
+            self.client.tracer._local = corolocal.local()
+        self.green_pool = eventlet.GreenPool(max_concurrency)
+
+        from reddwarfclient.commands import resources
+        for name in resources.names():
+            manager = getattr(self, name)
+            if isinstance(manager, tracing.TracedManager):
+                manager.manager._local = corolocal.local()
+            else:
+                manager._local = corolocal.local()
+            setattr(self, name, AsyncManager(manager, self.green_pool))
+        self.mgmt = type(self.mgmt)(self)
+
+        if prewarm:
+            self.prewarm(prewarm_connections)
+
+    def _default_pool(self):
+        import eventlet
+        green_httplib2 = eventlet.import_patched('httplib2')
+        return ConnectionPool(
+            maxsize=self._max_concurrency,
+            connection_types=build_connection_types(green_httplib2))
+
+    def _spawn(self, func):
+        import eventlet
+        return eventlet.spawn(func)
+
+    def batch(self, max_concurrency=None):
+        """
+        Returns a context which runs manager calls concurrently on green
+        threads from this object's pool, rather than on OS threads as
+        Dbaas.batch() does. It is used the same way.
+        """
+        return GreenBatch(self, max_concurrency=max_concurrency)
+
+    def waitall(self):
+        """Waits for every call spawned so far to finish."""
+        self.green_pool.waitall()
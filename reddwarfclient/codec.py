@@ -0,0 +1,166 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+JSON encoding and decoding for the whole package.
+
+Every JSON library installed is registered as a codec, and ``default()``
+returns the fastest of them. The REDDWARFCLIENT_JSON environment variable
+may name a codec to use instead.
+"""
+
+import json
+import re
+
+from reddwarfclient import utils
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Fastest first. simplejson's C decoder beats ujson on paged listings (see
+# tools/bench_json.py), and decoding is where the client spends its time.
+PREFERENCE = ['simplejson', 'ujson', 'json']
+
+codecs = utils.Registry()
+
+
+class JSONCodec(object):
+    """Wraps a json-like module.
+
+    ``dumps`` writes compact JSON for the wire, ``pretty`` readable JSON for
+    people, and ``loads`` raises ValueError on malformed input.
+    """
+
+    SEPARATORS = (',', ':')
+
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+
+    def dumps(self, obj):
+        return self.module.dumps(obj, separators=self.SEPARATORS)
+
+    def loads(self, string):
+        return self.module.loads(string)
+
+    def pretty(self, obj):
+        return self.module.dumps(obj, sort_keys=True, indent=4)
+
+    def raw_decoder(self):
+        """A decoder whose raw_decode(string, index) decodes one value."""
+        if hasattr(self.module, 'JSONDecoder'):
+            return self.module.JSONDecoder()
+        return json.JSONDecoder()
+
+    def iter_list(self, string, key, extras=None):
+        """Yields the items of the list under ``key`` in a JSON object.
+
+        Each item is decoded only when it is asked for, so a large listing
+        never exists as one big tree of dicts. The object's other values,
+        such as "links", are put in ``extras``. Raises KeyError if there is
+        no list under ``key`` and ValueError if the JSON is malformed.
+        """
+        if extras is None:
+            extras = {}
+        try:
+            for item in self._iter_list(string, key, extras):
+                yield item
+        except IndexError:
+            raise ValueError("Truncated JSON document.")
+
+    def _iter_list(self, string, key, extras):
+        decoder = self.raw_decoder()
+
+        def skip(index):
+            return WHITESPACE.match(string, index).end()
+
+        def expect(index, chars):
+            index = skip(index)
+            if string[index] not in chars:
+                raise ValueError("Expected %r at char %d of JSON document."
+                                 % (chars, index))
+            return string[index], index + 1
+
+        found = False
+        char, index = expect(0, '{')
+        if string[skip(index)] == '}':
+            raise KeyError(key)
+        while char != '}':
+            name, index = decoder.raw_decode(string, skip(index))
+            char, index = expect(index, ':')
+            index = skip(index)
+            if name == key and string[index] == '[':
+                found = True
+                index += 1
+                if string[skip(index)] == ']':
+                    char, index = expect(index, ']')
+                while char != ']':
+                    item, index = decoder.raw_decode(string, skip(index))
+                    yield item
+                    char, index = expect(index, ',]')
+            else:
+                extras[name], index = decoder.raw_decode(string, index)
+            char, index = expect(index, ',}')
+        if not found:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return "<JSONCodec %s>" % self.name
+
+
+class UltraJSONCodec(JSONCodec):
+    """ujson is compact by default and has no separators argument. Older
+    versions cannot sort keys, so readable output comes from json."""
+
+    def dumps(self, obj):
+        return self.module.dumps(obj)
+
+    def pretty(self, obj):
+        return codecs['json'].pretty(obj)
+
+
+def _register(name, codec_cls=JSONCodec):
+    try:
+        module = __import__(name)
+    except ImportError:
+        return
+    codecs.register(name, codec_cls(name, module))
+
+
+_register('json')
+_register('simplejson')
+_register('ujson', UltraJSONCodec)
+
+
+def get_codec(name):
+    """Returns the codec registered under ``name``."""
+    codec = codecs.get(name)
+    if codec is None:
+        raise ValueError("No JSON codec named %r is available." % name)
+    return codec
+
+
+def fastest():
+    for name in PREFERENCE:
+        if codecs.get(name) is not None:
+            return codecs[name]
+    raise ValueError("No JSON codec is available.")
+
+
+def default():
+    """Returns the codec named by REDDWARFCLIENT_JSON, else the fastest."""
+    name = utils.env('REDDWARFCLIENT_JSON')
+    if name:
+        return get_codec(name)
+    return fastest()
@@ -46,6 +46,10 @@ class ResourceRegisty(object):
         for key, klass in self._resources.iteritems():
             setattr(client, key, klass(client))
 
+    def names(self):
+        """Returns the attribute names load() sets on the client."""
+        return self._resources.keys()
+
     def register(self, resource):
         if resource.name in self._resources:
             return
@@ -13,13 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import urlparse
-
 from reddwarfclient import base
 from reddwarfclient import common
 from reddwarfclient.common import check_for_exceptions
 from reddwarfclient.common import limit_url
+from reddwarfclient.common import next_marker
 from reddwarfclient.common import Paginated
+from reddwarfclient.common import stream_list
 from reddwarfclient import exceptions
 
 
@@ -72,29 +72,30 @@ class Instances(base.ManagerWithFind):
 
         return self._create("/instances", body, "instance")
 
-    def _list(self, url, response_key, limit=None, marker=None):
+    def _list(self, url, response_key, limit=None, marker=None,
+              stream=False):
+        if stream:
+            return stream_list(self, limit_url(url, limit, marker),
+                               response_key)
         resp, body = self.api.client.get(limit_url(url, limit, marker))
         if not body:
             raise Exception("Call to " + url + " did not return a body.")
         links = body.get('links', [])
-        next_links = [link['href'] for link in links if link['rel'] == 'next']
-        next_marker = None
-        for link in next_links:
-            # Extract the marker from the url.
-            parsed_url = urlparse.urlparse(link)
-            query_dict = dict(urlparse.parse_qsl(parsed_url.query))
-            next_marker = query_dict.get('marker', None)
         instances = body[response_key]
         instances = [self.resource_class(self, res) for res in instances]
-        return Paginated(instances, next_marker=next_marker, links=links)
+        return Paginated(instances, next_marker=next_marker(links),
+                         links=links)
 
-    def list(self, limit=None, marker=None):
+    def list(self, limit=None, marker=None, stream=False):
         """
         Get a list of all instances.
 
+        With stream=True the page is decoded one instance at a time as it is
+        iterated over, which keeps memory use flat for large pages.
+
         :rtype: list of :class:`Instance`.
         """
-        return self._list("/instances", "instances", limit, marker)
+        return self._list("/instances", "instances", limit, marker, stream)
 
     def get(self, instance):
         """
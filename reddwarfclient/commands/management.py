@@ -14,11 +14,12 @@
 #    under the License.
 
 from reddwarfclient import base
-import urlparse
 
 from reddwarfclient.common import check_for_exceptions
 from reddwarfclient.common import limit_url
+from reddwarfclient.common import next_marker
 from reddwarfclient.common import Paginated
+from reddwarfclient.common import stream_list
 from reddwarfclient.commands.instances import Instance
 
 
@@ -35,21 +36,19 @@ class Management(base.ManagerWithFind):
     resource_class = Instance
     name = 'management'
 
-    def _list(self, url, response_key, limit=None, marker=None):
+    def _list(self, url, response_key, limit=None, marker=None,
+              stream=False):
+        if stream:
+            return stream_list(self, limit_url(url, limit, marker),
+                               response_key)
         resp, body = self.api.client.get(limit_url(url, limit, marker))
         if not body:
             raise Exception("Call to " + url + " did not return a body.")
         links = body.get('links', [])
-        next_links = [link['href'] for link in links if link['rel'] == 'next']
-        next_marker = None
-        for link in next_links:
-            # Extract the marker from the url.
-            parsed_url = urlparse.urlparse(link)
-            query_dict = dict(urlparse.parse_qsl(parsed_url.query))
-            next_marker = query_dict.get('marker', None)
         instances = body[response_key]
         instances = [self.resource_class(self, res) for res in instances]
-        return Paginated(instances, next_marker=next_marker, links=links)
+        return Paginated(instances, next_marker=next_marker(links),
+                         links=links)
 
     def show(self, instance):
         """
@@ -61,10 +60,11 @@ class Management(base.ManagerWithFind):
         return self._get("/mgmt/instances/%s" % base.getid(instance),
                          'instance')
 
-    def index(self, deleted=None, limit=None, marker=None):
+    def index(self, deleted=None, limit=None, marker=None, stream=False):
         """
         Show an overview of all local instances.
-        Optionally, filter by deleted status.
+        Optionally, filter by deleted status. With stream=True the instances
+        are decoded one at a time as the result is iterated over.
 
         :rtype: list of :class:`Instance`.
         """
@@ -76,7 +76,7 @@ class Management(base.ManagerWithFind):
                 form = "?deleted=false"
 
         url = "/mgmt/instances%s" % form
-        return self._list(url, "instances", limit, marker)
+        return self._list(url, "instances", limit, marker, stream)
 
     def root_enabled_history(self, instance):
         """
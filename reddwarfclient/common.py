@@ -13,15 +13,18 @@
 #    under the License.
 
 import copy
-import json
 import optparse
 import os
 import pickle
 import sys
+import urlparse
 
 from reddwarfclient import client
+from reddwarfclient import codec
 from reddwarfclient.xml import ReddwarfXmlClient
 from reddwarfclient import exceptions
+from reddwarfclient import tokencache
+from reddwarfclient import tracing
 from reddwarfclient.utils import Registry
 
 
@@ -69,6 +72,27 @@ def limit_url(url, limit=None, marker=None):
     return url + query
 
 
+def next_marker(links):
+    """Returns the marker from the "next" link of a page, if there is one."""
+    marker = None
+    for link in links:
+        if link['rel'] != 'next':
+            continue
+        # Extract the marker from the url.
+        parsed_url = urlparse.urlparse(link['href'])
+        query_dict = dict(urlparse.parse_qsl(parsed_url.query))
+        marker = query_dict.get('marker', None)
+    return marker
+
+
+def stream_list(manager, url, response_key):
+    """GETs a page of a list and returns it as a StreamedPaginated."""
+    resp, body = manager.api.client.get(url, parse=False)
+    if not body:
+        raise Exception("Call to " + url + " did not return a body.")
+    return StreamedPaginated(manager, body, response_key)
+
+
 class CliOptions(object):
     """A token object containing the user, apikey and token which
        is pickleable."""
@@ -90,6 +114,7 @@ class CliOptions(object):
         'debug': False,
         'token': None,
         'xml': None,
+        'trace': None,
     }
 
     def __init__(self, **kwargs):
@@ -164,6 +189,8 @@ class CliOptions(object):
                    help="Run in insecure mode for https endpoints.")
         add_option("token", help="Token from a prior login.")
         add_option("xml", action="store_true", help="Changes format to XML.")
+        add_option("trace", help="Append a trace of where each call spent "
+                   "its time to this file, as JSON lines.")
 
         oparser.add_option("--secure", action="store_false", dest="insecure",
                    help="Run in insecure mode for https endpoints.")
@@ -200,17 +227,22 @@ class CommandsBase(object):
             if self.verbose:
                 client.log_to_streamhandler(sys.stdout)
                 client.RDC_PP = True
+            tracer = None
+            if getattr(self, 'trace', None):
+                tracer = tracing.Tracer(tracing.JSONLinesExporter(self.trace))
             return client.Dbaas(self.username, self.apikey, self.tenant_id,
-                          auth_url=self.auth_url,
-                          auth_strategy=self.auth_type,
-                          service_type=self.service_type,
-                          service_name=self.service_name,
-                          region_name=self.region,
-                          service_url=self.service_url,
-                          insecure=self.insecure,
-                          client_cls=client_cls,
-                          options=self.options,
-                          args=self.args)
+                                auth_url=self.auth_url,
+                                auth_strategy=self.auth_type,
+                                service_type=self.service_type,
+                                service_name=self.service_name,
+                                region_name=self.region,
+                                service_url=self.service_url,
+                                insecure=self.insecure,
+                                client_cls=client_cls,
+                                options=self.options,
+                                args=self.args,
+                                tracer=tracer,
+                                token_cache=tokencache.TokenCache())
         except:
             if self.debug:
                 raise
@@ -262,13 +294,13 @@ class CommandsBase(object):
         def wrapped_func():
             result = func(*args, **kwargs)
             if result:
-                print(json.dumps(result._info, sort_keys=True, indent=4))
+                print(self._dumps(result._info))
             else:
                 print("OK")
         self._safe_exec(wrapped_func)
 
     def _dumps(self, item):
-        return json.dumps(item, sort_keys=True, indent=4)
+        return codec.default().pretty(item)
 
     def _pretty_list(self, func, *args, **kwargs):
         result = self._safe_exec(func, *args, **kwargs)
@@ -399,6 +431,26 @@ class Paginated(object):
         return needle in self.items
 
 
+class StreamedPaginated(object):
+    """ Yields resources as the items of a raw list response are decoded, so
+        only one item is built at a time. It can be iterated over once; next
+        and links are set when the iteration is done. """
+
+    def __init__(self, manager, body_string, response_key):
+        self.manager = manager
+        self.next = None
+        self.links = []
+        self._extras = {}
+        self._items = manager.api.client.iter_response_list(
+            body_string, response_key, self._extras)
+
+    def __iter__(self):
+        for item in self._items:
+            yield self.manager.resource_class(self.manager, item)
+        self.links = self._extras.get('links', [])
+        self.next = next_marker(self.links)
+
+
 # Global registry for command line tools
 cli_commands = Registry()
 mcli_commands = Registry()
@@ -406,4 +458,4 @@ mcli_commands = Registry()
 
 # register the Auth command
 cli_commands.register('auth', Auth)
-mcli_commands.register('auth', Auth)
\ No newline at end of file
+mcli_commands.register('auth', Auth)
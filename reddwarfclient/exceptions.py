@@ -66,15 +66,27 @@ class AmbiguousEndpoints(Exception):
         return "AmbiguousEndpoints: %s" % repr(self.endpoints)
 
 
+class CircuitOpen(Exception):
+    """Every endpoint for the service failed recently; not calling any."""
+    def __init__(self, endpoints=None):
+        self.endpoints = endpoints
+
+    def __str__(self):
+        return "CircuitOpen: %s" % repr(self.endpoints)
+
+
 class ClientException(Exception):
     """
     The base exception class for all exceptions this library raises.
     """
-    def __init__(self, code, message=None, details=None, request_id=None):
+    def __init__(self, code, message=None, details=None, request_id=None,
+                 retry_after=None):
         self.code = code
         self.message = message or self.__class__.message
         self.details = details
         self.request_id = request_id
+        # Raw Retry-After header or overLimit retryAfter value, if any.
+        self.retry_after = retry_after
 
     def __str__(self):
         formatted_string = "%s (HTTP %s)" % (self.message, self.code)
@@ -166,6 +178,7 @@ def from_response(response, body):
             raise exception_from_response(resp, body)
     """
     cls = _code_map.get(response.status, ClientException)
+    retry_after = response.get('retry-after')
     if body:
         message = "n/a"
         details = "n/a"
@@ -173,7 +186,10 @@ def from_response(response, body):
             error = body[body.keys()[0]]
             message = error.get('message', None)
             details = error.get('details', None)
-        return cls(code=response.status, message=message, details=details)
+            retry_after = error.get('retryAfter', retry_after)
+        return cls(code=response.status, message=message, details=details,
+                   retry_after=retry_after)
     else:
         request_id = response.get('x-compute-request-id')
-        return cls(code=response.status, request_id=request_id)
+        return cls(code=response.status, request_id=request_id,
+                   retry_after=retry_after)
@@ -0,0 +1,304 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Exports metrics.RequestMetrics to Prometheus or StatsD.
+
+Prometheus can read the text exposition format from a file, for the node
+exporter's textfile collector, or scrape it over HTTP. StatsD is sent UDP
+datagrams on an interval.
+"""
+
+import BaseHTTPServer
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+
+from reddwarfclient.metrics import PERCENTILES
+from reddwarfclient.metrics import RequestMetrics
+from reddwarfclient.metrics import RouteStats
+
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = 'reddwarfclient'
+
+# Upper bounds, in seconds, of the Prometheus histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Keeps datagrams under the smallest MTU StatsD setups commonly assume.
+STATSD_MAX_PACKET = 512
+
+STATSD_UNSAFE = re.compile(r'[^A-Za-z0-9_\-]+')
+
+
+def _label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _label_value(labels[name]))
+                             for name in sorted(labels))
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+def prometheus_text(metrics, prefix=DEFAULT_PREFIX, buckets=DEFAULT_BUCKETS):
+    """Returns ``metrics`` in the Prometheus text exposition format."""
+    snapshot = metrics.snapshot()
+    routes = sorted(snapshot.by_route().items())
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+        lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+    def sample(name, value, **labels):
+        lines.append('%s_%s%s %s' % (prefix, name, _labels(**labels),
+                                     _number(value)))
+
+    statuses = sorted(snapshot.stats.items())
+    family('requests_total', 'counter', 'Requests sent, by response status.')
+    for (method, route, status), stats in statuses:
+        sample('requests_total', stats.count, method=method, route=route,
+               status=status)
+
+    family('request_errors_total', 'counter',
+           'Requests which failed or got a 400 or higher status.')
+    for (method, route, status), stats in statuses:
+        sample('request_errors_total', stats.errors, method=method,
+               route=route, status=status)
+
+    family('request_duration_seconds', 'histogram',
+           'Time from sending a request to reading its response.')
+    for (method, route), stats in routes:
+        latency = stats.latency
+        for bound in tuple(buckets) + (float('inf'),):
+            if bound == float('inf'):
+                count = latency.count
+            else:
+                count = latency.count_at_or_below(bound)
+            sample('request_duration_seconds_bucket', count, method=method,
+                   route=route, le=_number(float(bound)))
+        sample('request_duration_seconds_sum', latency.total,
+               method=method, route=route)
+        sample('request_duration_seconds_count', latency.count,
+               method=method, route=route)
+
+    family('request_bytes_total', 'counter', 'Request body bytes sent.')
+    for (method, route), stats in routes:
+        sample('request_bytes_total', stats.bytes_out, method=method,
+               route=route)
+
+    family('response_bytes_total', 'counter',
+           'Response body bytes received.')
+    for (method, route), stats in routes:
+        sample('response_bytes_total', stats.bytes_in, method=method,
+               route=route)
+
+    family('retries_total', 'counter', 'Requests retried.')
+    for (method, route), count in sorted(snapshot.retries.items()):
+        sample('retries_total', count, method=method, route=route)
+
+    family('auth_refreshes_total', 'counter', 'Logins to the auth service.')
+    sample('auth_refreshes_total', snapshot.auth_refreshes)
+
+    family('auth_shared_total', 'counter',
+           'Requests which waited for a login already under way.')
+    sample('auth_shared_total', snapshot.auth_shared)
+
+    family('auth_failures_total', 'counter', 'Logins which failed.')
+    sample('auth_failures_total', snapshot.auth_failures)
+
+    family('requests_in_flight', 'gauge', 'Requests waiting on a response.')
+    sample('requests_in_flight', snapshot.in_flight)
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(metrics, path, prefix=DEFAULT_PREFIX):
+    """Atomically replaces ``path`` with ``metrics`` in the text format, so
+    a collector never reads a half written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.reddwarf')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            temp_file.write(prometheus_text(metrics, prefix=prefix))
+        os.chmod(temp_path, 0644)
+        os.rename(temp_path, path)
+    except:
+        os.unlink(temp_path)
+        raise
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers any GET with the server's metrics in the text format."""
+
+    def do_GET(self):
+        body = prometheus_text(self.server.metrics,
+                               prefix=self.server.prefix)
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logger.debug(format, *args)
+
+
+def serve(metrics, port=0, host='127.0.0.1', prefix=DEFAULT_PREFIX):
+    """Serves ``metrics`` for Prometheus from a daemon thread.
+
+    Returns the HTTPServer; its server_address has the port used, and
+    shutdown() stops it.
+    """
+    server = BaseHTTPServer.HTTPServer((host, port), MetricsHandler)
+    server.metrics = metrics
+    server.prefix = prefix
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def _statsd_name(*parts):
+    return '.'.join(STATSD_UNSAFE.sub('_', str(part).strip('/')) or '_'
+                    for part in parts)
+
+
+class StatsdExporter(object):
+    """
+    Sends RequestMetrics to a StatsD server over UDP.
+
+    Each send() reports what happened since the previous one: counters as
+    deltas, the latency percentiles of the requests in between as timing
+    gauges in milliseconds, and the requests in flight. Nothing is sent for
+    routes which saw no requests. Call start() to send on an interval from a
+    daemon thread.
+    """
+
+    def __init__(self, metrics, host='127.0.0.1', port=8125,
+                 prefix=DEFAULT_PREFIX, max_packet=STATSD_MAX_PACKET):
+        self.metrics = metrics
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet = max_packet
+        self._previous = RequestMetrics(metrics.precision)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def lines(self):
+        """Returns the StatsD lines for the requests since the last call."""
+        current = self.metrics.snapshot()
+        previous, self._previous = self._previous, current
+        lines = []
+
+        def count(value, earlier, *name):
+            delta = value - earlier
+            if delta < 0:  # The metrics were cleared.
+                delta = value
+            if delta:
+                lines.append('%s:%d|c' % (_statsd_name(self.prefix, *name),
+                                          delta))
+
+        for key, stats in sorted(current.stats.items()):
+            method, route, status = key
+            earlier = previous.stats.get(key)
+            count(stats.count, earlier.count if earlier else 0,
+                  'requests', method, route, status)
+
+        previous_routes = previous.by_route()
+        for (method, route), stats in sorted(current.by_route().items()):
+            earlier = previous_routes.get((method, route))
+            if earlier is None:
+                earlier = RouteStats(current.precision)
+            count(stats.errors, earlier.errors, 'errors', method, route)
+            count(stats.bytes_out, earlier.bytes_out, 'bytes_out', method,
+                  route)
+            count(stats.bytes_in, earlier.bytes_in, 'bytes_in', method, route)
+            latency = stats.latency.since(earlier.latency)
+            if latency.count:
+                for percent in PERCENTILES:
+                    name = _statsd_name(self.prefix, 'latency', method,
+                                        route, 'p%d' % percent)
+                    lines.append('%s:%d|g' % (
+                        name, round(latency.percentile(percent) * 1000)))
+
+        for key, retries in sorted(current.retries.items()):
+            count(retries, previous.retries.get(key, 0), 'retries', *key)
+        count(current.auth_refreshes, previous.auth_refreshes,
+              'auth_refreshes')
+        count(current.auth_shared, previous.auth_shared, 'auth_shared')
+        count(current.auth_failures, previous.auth_failures, 'auth_failures')
+        lines.append('%s:%d|g' % (_statsd_name(self.prefix, 'in_flight'),
+                                  current.in_flight))
+        return lines
+
+    def packets(self, lines):
+        """Joins lines into datagrams of at most max_packet bytes."""
+        packet = []
+        size = 0
+        for line in lines:
+            if packet and size + len(line) + 1 > self.max_packet:
+                yield '\n'.join(packet)
+                packet = []
+                size = 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            yield '\n'.join(packet)
+
+    def send(self):
+        for packet in self.packets(self.lines()):
+            try:
+                self._socket.sendto(packet, self.address)
+            except socket.error, ex:
+                # StatsD is best effort; never let it break the caller.
+                _logger.debug("Could not send metrics to StatsD: %s", ex)
+
+    def start(self, interval=10):
+        """Sends every ``interval`` seconds until stop() is called."""
+        def run():
+            # Event.wait() returns None rather than the flag on Python 2.6.
+            while not self._stopped.is_set():
+                self._stopped.wait(interval)
+                if not self._stopped.is_set():
+                    self.send()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the interval thread after one last send."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.send()
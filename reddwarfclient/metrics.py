@@ -0,0 +1,313 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Per route request metrics: latency histograms, counts and bytes.
+"""
+
+import math
+import re
+import threading
+import urlparse
+
+
+# Path segments which are part of a route rather than an identifier.
+ROUTE_WORDS = frozenset([
+    'accounts', 'action', 'databases', 'diagnostics', 'flavors', 'hosts',
+    'hwinfo', 'instances', 'limits', 'mgmt', 'root', 'storage', 'tokens',
+    'users', 'versions',
+])
+
+VERSION = re.compile(r'^v\d+(\.\d+)*$')
+
+PERCENTILES = (50, 95, 99)
+
+# Relative width of a histogram bucket; percentiles are this close to the
+# true value.
+DEFAULT_PRECISION = 0.02
+
+# Latencies below this many seconds share the first bucket.
+MIN_VALUE = 1e-6
+
+
+def route_template(url, prefixes=()):
+    """Returns the route of ``url`` with identifiers replaced by {id}.
+
+    The first of ``prefixes`` (service URLs) the URL starts with is removed
+    first, along with the query string, so
+    "http://host/v1.0/1234/instances/5a6b/action?x=1" with the prefix
+    "http://host/v1.0/1234" becomes "/instances/{id}/action".
+    """
+    for prefix in prefixes:
+        if prefix and url.startswith(prefix):
+            path = url[len(prefix):]
+            break
+    else:
+        path = urlparse.urlparse(url).path
+    path = path.split('?', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        if segment and segment not in ROUTE_WORDS and \
+                not VERSION.match(segment):
+            segment = '{id}'
+        segments.append(segment)
+    return '/'.join(segments) or '/'
+
+
+class Histogram(object):
+    """
+    A sparse histogram with buckets of logarithmically growing width.
+
+    Each bucket spans ``precision`` of its lower bound, so any latency from
+    a microsecond to hours is recorded to within that relative error in a
+    handful of counters. Histograms with the same precision can be merged
+    by adding their buckets, e.g. to combine several clients or processes.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self._log_base = math.log(1 + precision)
+        self.buckets = {}  # {index: count}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value <= MIN_VALUE:
+            return 0
+        return int(math.ceil(math.log(value / MIN_VALUE) / self._log_base))
+
+    def _value(self, index):
+        return MIN_VALUE * math.exp(index * self._log_base)
+
+    def record(self, value):
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge histograms of different "
+                             "precision.")
+        for index, count in other.buckets.iteritems():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is None:
+                continue
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def count_at_or_below(self, value):
+        """How many recorded values were at most ``value``, to within the
+        histogram's precision."""
+        return sum(count for index, count in self.buckets.iteritems()
+                   if self._value(index) <= value)
+
+    def since(self, earlier):
+        """Returns a histogram of the values recorded after ``earlier``, an
+        older copy of this one. Its min and max are bucket bounds."""
+        delta = Histogram(self.precision)
+        for index, count in self.buckets.iteritems():
+            count -= earlier.buckets.get(index, 0)
+            if count > 0:
+                delta.buckets[index] = count
+        delta.count = sum(delta.buckets.itervalues())
+        delta.total = max(0.0, self.total - earlier.total)
+        if delta.buckets:
+            delta.min = delta._value(min(delta.buckets) - 1)
+            delta.max = delta._value(max(delta.buckets))
+        return delta
+
+    def percentile(self, percent):
+        """The value ``percent`` percent of the recorded values are at or
+        below, or None if nothing has been recorded."""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+
+class RouteStats(object):
+    """What is known about the requests to one route."""
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.latency = Histogram(precision)
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    def record(self, seconds, error=False, bytes_out=0, bytes_in=0):
+        self.latency.record(seconds)
+        if error:
+            self.errors += 1
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.errors += other.errors
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+    def to_dict(self):
+        result = {'count': self.count, 'errors': self.errors,
+                  'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                  'mean': self.latency.mean()}
+        for percent in PERCENTILES:
+            result['p%d' % percent] = self.latency.percentile(percent)
+        return result
+
+
+class RequestMetrics(object):
+    """
+    Latency histograms, error counts and bytes per route, method and status.
+
+    Give one to ReddwarfHTTPClient as ``metrics`` and every request it makes
+    is recorded against its route template, so requests for different
+    instances add up to one /instances/{id} entry. A response of 400 or
+    above, or a connection failure, counts as an error. Retries, logins
+    (with those shared by several threads and those which failed) and the
+    number of requests in flight are counted too. One instance may be
+    shared by several clients.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.stats = {}  # {(method, route, status): RouteStats}
+        self.retries = {}  # {(method, route): count}
+        self.auth_refreshes = 0
+        self.auth_shared = 0  # Threads which waited on another's login.
+        self.auth_failures = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_retry(self, method, route):
+        with self._lock:
+            key = (method, route)
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def record_auth(self):
+        with self._lock:
+            self.auth_refreshes += 1
+
+    def record_auth_shared(self):
+        with self._lock:
+            self.auth_shared += 1
+
+    def record_auth_failure(self):
+        with self._lock:
+            self.auth_failures += 1
+
+    def record(self, method, route, status, seconds, bytes_out=0,
+               bytes_in=0, error=None):
+        if error is None:
+            error = status >= 400
+        key = (method, route, status)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = RouteStats(self.precision)
+            stats.record(seconds, error=error, bytes_out=bytes_out,
+                         bytes_in=bytes_in)
+
+    def merge(self, other):
+        """Adds the requests recorded by ``other`` to these metrics."""
+        with other._lock:
+            items = [(key, stats) for key, stats in other.stats.iteritems()]
+            retries = dict(other.retries)
+            auth_refreshes = other.auth_refreshes
+            auth_shared = other.auth_shared
+            auth_failures = other.auth_failures
+        with self._lock:
+            for key, stats in items:
+                mine = self.stats.get(key)
+                if mine is None:
+                    mine = self.stats[key] = RouteStats(self.precision)
+                mine.merge(stats)
+            for key, count in retries.iteritems():
+                self.retries[key] = self.retries.get(key, 0) + count
+            self.auth_refreshes += auth_refreshes
+            self.auth_shared += auth_shared
+            self.auth_failures += auth_failures
+
+    def snapshot(self):
+        """Returns a copy which later requests will not change."""
+        copy = RequestMetrics(self.precision)
+        copy.merge(self)
+        copy.in_flight = self.in_flight
+        return copy
+
+    def by_route(self):
+        """Returns {(method, route): RouteStats} with statuses combined."""
+        routes = {}
+        with self._lock:
+            for (method, route, status), stats in self.stats.iteritems():
+                combined = routes.get((method, route))
+                if combined is None:
+                    combined = routes[(method, route)] = \
+                        RouteStats(self.precision)
+                combined.merge(stats)
+        return routes
+
+    def report(self):
+        """Returns a list of dicts, one per method and route, with the
+        count, errors, bytes in and out, mean and p50/p95/p99 seconds."""
+        report = []
+        for (method, route), stats in sorted(self.by_route().items()):
+            row = stats.to_dict()
+            row['method'] = method
+            row['route'] = route
+            report.append(row)
+        return report
+
+    def clear(self):
+        """Forgets everything but the requests still in flight."""
+        with self._lock:
+            self.stats.clear()
+            self.retries.clear()
+            self.auth_refreshes = 0
+            self.auth_shared = 0
+            self.auth_failures = 0
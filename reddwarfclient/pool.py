@@ -0,0 +1,500 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Keep-alive connection pooling for the HTTP client.
+
+httplib2 keeps a single connection per host in ``Http.connections``. The
+pool here sits behind that dictionary: before a request the client checks
+an idle connection out of the pool, and afterwards every connection httplib2
+used is handed back so the next request can reuse the open socket.
+"""
+
+import socket
+import threading
+import time
+
+import httplib2
+
+
+DEFAULT_MAXSIZE = 10
+DEFAULT_IDLE_TIMEOUT = 60
+DEFAULT_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Seconds a DNSCache keeps an answer.
+DEFAULT_DNS_TTL = 300
+
+
+def set_socket_options(sock, options):
+    """Applies a list of (level, option, value) tuples to a socket."""
+    if sock is None:
+        return
+    for level, option, value in options:
+        sock.setsockopt(level, option, value)
+
+
+class DNSCache(object):
+    """
+    Remembers getaddrinfo() answers for ``ttl`` seconds.
+
+    Given to a ConnectionPool, new connections look their host up here
+    first, so only the first connection to a host in each ``ttl`` pays for
+    resolving it. An answer none of whose addresses could be connected to
+    is forgotten.
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL):
+        self.ttl = ttl
+        self._answers = {}  # {(host, port): (expires, addresses)}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port, getaddrinfo=socket.getaddrinfo):
+        """Returns the getaddrinfo() TCP addresses of ``host``."""
+        key = (host, port)
+        with self._lock:
+            answer = self._answers.get(key)
+        if answer is not None and answer[0] > time.time():
+            return answer[1]
+        addresses = getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._answers[key] = (time.time() + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        with self._lock:
+            self._answers.pop((host, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._answers.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            answer = self._answers.get(key)
+        return answer is not None and answer[0] > time.time()
+
+
+def supports_sessions(ssl):
+    """True if TLS sessions can be resumed with the ``ssl`` module."""
+    return hasattr(ssl, 'SSLSession')
+
+
+class TLSSessions(object):
+    """
+    Shares SSL contexts and TLS sessions between HTTPS connections.
+
+    Building an SSL context loads the CA bundle, so one context is made per
+    CA bundle and validation mode and used for every connection. Where the
+    ssl module supports client sessions (SSLSession, in Python 3.6 and
+    later), the last session with each host is offered to the next
+    connection to it, which then skips the full handshake. Sessions from
+    unvalidated (insecure) connections are never offered to validating
+    ones, nor the other way around. ``resumed`` and ``full`` count the
+    handshakes of each kind.
+
+    The Python 2 ssl module has no client sessions, so under the Pythons
+    this package runs on no session is ever kept or offered: only the
+    contexts are shared, and every handshake counts as full.
+    """
+
+    def __init__(self):
+        self.resumed = 0
+        self.full = 0
+        self._contexts = {}  # {(ssl module, ca_certs, validate): context}
+        self._sessions = {}  # {(host, port, validate): session}
+        self._lock = threading.Lock()
+
+    def context(self, ssl, ca_certs, validate):
+        """Returns the context for a CA bundle and validation mode."""
+        key = (ssl, ca_certs, validate)
+        with self._lock:
+            context = self._contexts.get(key)
+        if context is None:
+            context = ssl.create_default_context(cafile=ca_certs)
+            if not validate:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            with self._lock:
+                context = self._contexts.setdefault(key, context)
+        return context
+
+    def session(self, key):
+        """Returns the session to offer a new connection, or None."""
+        with self._lock:
+            return self._sessions.get(key)
+
+    def handshake_done(self, key, sock):
+        """Counts the handshake ``sock`` made and keeps its session."""
+        resumed = getattr(sock, 'session_reused', False)
+        with self._lock:
+            if resumed:
+                self.resumed += 1
+            else:
+                self.full += 1
+        self.save(key, sock)
+
+    def save(self, key, sock):
+        """Keeps the session of ``sock``, which may have been replaced by
+        a ticket after the handshake."""
+        session = getattr(sock, 'session', None)
+        if session is not None:
+            with self._lock:
+                self._sessions[key] = session
+
+    def stats(self):
+        with self._lock:
+            return {'resumed': self.resumed, 'full': self.full}
+
+    def clear(self):
+        """Forgets the sessions and contexts; the counts are kept."""
+        with self._lock:
+            self._sessions.clear()
+            self._contexts.clear()
+
+
+# The phases of a request a connection times, in seconds.
+PHASES = ('dns', 'connect', 'tls', 'write', 'ttfb', 'read')
+
+
+# Old style, like the httplib classes it is mixed into.
+class TimedConnection:
+    """
+    Times the phases of the requests sent over an httplib2 connection.
+
+    Mixed into the connection classes of build_connection_types. Each
+    exchange is bracketed by start_timing() and finish_timing(), which
+    returns {phase: seconds} for DNS resolution, TCP connect, the TLS
+    handshake, writing the request, waiting for the first byte of the
+    response and reading its body, plus "reused", true if no new socket
+    had to be opened.
+
+    httplib2's own connect() is used, and timed as a whole as "connect",
+    for proxies, client certificates and pinned SSL versions.
+    """
+
+    timings = None
+    dns_cache = None
+    tls_sessions = None
+    _response_time = None
+
+    def start_timing(self):
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.timings['reused'] = True
+        self._response_time = None
+
+    def finish_timing(self):
+        """Returns the timings of the exchange since start_timing()."""
+        timings, self.timings = self.timings, None
+        if timings is not None and self._response_time is not None:
+            timings['read'] = time.time() - self._response_time
+        return timings
+
+    def _add_timing(self, phase, seconds):
+        if self.timings is not None:
+            self.timings[phase] += seconds
+
+    def _plain_connect(self):
+        """True if this connection can be opened step by step."""
+        return not (self.proxy_info and self.proxy_info.isgood())
+
+    def connect(self):
+        if self.timings is not None:
+            self.timings['reused'] = False
+        start = time.time()
+        if not self._plain_connect():
+            self._base.connect(self)
+            self._add_timing('connect', time.time() - start)
+            set_socket_options(self.sock, self.socket_options)
+            return
+        sock = self._open_socket(start)
+        set_socket_options(sock, self.socket_options)
+        self.sock = self._start_tls(sock)
+
+    def _open_socket(self, start):
+        if self.dns_cache is not None:
+            addresses = self.dns_cache.resolve(self.host, self.port,
+                                               self._socket.getaddrinfo)
+        else:
+            addresses = self._socket.getaddrinfo(self.host, self.port, 0,
+                                                 self._socket.SOCK_STREAM)
+        resolved = time.time()
+        self._add_timing('dns', resolved - start)
+        error = None
+        for family, socktype, proto, canonname, address in addresses:
+            sock = self._socket.socket(family, socktype, proto)
+            if self._http.has_timeout(self.timeout):
+                sock.settimeout(self.timeout)
+            try:
+                sock.connect(address)
+            except self._socket.error, ex:
+                error = ex
+                sock.close()
+                continue
+            break
+        else:
+            if self.dns_cache is not None:
+                self.dns_cache.forget(self.host, self.port)
+            raise error or self._socket.error("getaddrinfo returns an empty "
+                                              "list")
+        self._add_timing('connect', time.time() - resolved)
+        return sock
+
+    def _start_tls(self, sock):
+        return sock
+
+    def request(self, *args, **kwargs):
+        start = time.time()
+        self._base.request(self, *args, **kwargs)
+        self._add_timing('write', time.time() - start)
+
+    def getresponse(self, *args, **kwargs):
+        start = time.time()
+        response = self._base.getresponse(self, *args, **kwargs)
+        self._response_time = time.time()
+        self._add_timing('ttfb', self._response_time - start)
+        return response
+
+
+def build_connection_types(http=httplib2):
+    """Returns {scheme: connection class} built on an httplib2 module.
+
+    Passing a patched copy of httplib2, such as the one returned by
+    ``eventlet.import_patched('httplib2')``, gives connections which use
+    that module's sockets.
+    """
+
+    class HTTPConnection(TimedConnection, http.HTTPConnectionWithTimeout):
+        """An httplib2 connection which applies socket options on connect
+        and times its requests."""
+
+        socket_options = ()
+        _base = http.HTTPConnectionWithTimeout
+        _http = http
+        _socket = http.socket
+
+    class HTTPSConnection(TimedConnection, http.HTTPSConnectionWithTimeout):
+        """An httplib2 SSL connection which applies socket options on
+        connect and times its requests."""
+
+        socket_options = ()
+        _base = http.HTTPSConnectionWithTimeout
+        _http = http
+        _socket = http.socket
+
+        def _plain_connect(self):
+            return (TimedConnection._plain_connect(self) and
+                    not self.cert_file and
+                    getattr(self, 'ssl_version', None) is None)
+
+        def _start_tls(self, sock):
+            start = time.time()
+            try:
+                return self._handshake(sock)
+            except:
+                sock.close()
+                raise
+            finally:
+                self._add_timing('tls', time.time() - start)
+
+        def _session_key(self):
+            return (self.host, self.port,
+                    not self.disable_ssl_certificate_validation)
+
+        def _handshake(self, sock):
+            ssl = http.ssl
+            validate = not self.disable_ssl_certificate_validation
+            sessions = self.tls_sessions
+            if sessions is not None and \
+                    hasattr(ssl, 'create_default_context'):
+                context = sessions.context(ssl, self.ca_certs, validate)
+                kwargs = {'server_hostname': self.host}
+                if supports_sessions(ssl):
+                    session = sessions.session(self._session_key())
+                    if session is not None:
+                        kwargs['session'] = session
+                tls_sock = context.wrap_socket(sock, **kwargs)
+                sessions.handshake_done(self._session_key(), tls_sock)
+                return tls_sock
+            if hasattr(ssl, 'create_default_context'):
+                context = ssl.create_default_context(cafile=self.ca_certs)
+                if not validate:
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                return context.wrap_socket(sock, server_hostname=self.host)
+            cert_reqs = ssl.CERT_REQUIRED if validate else ssl.CERT_NONE
+            tls_sock = ssl.wrap_socket(sock, cert_reqs=cert_reqs,
+                                       ca_certs=self.ca_certs)
+            if validate:
+                cert = tls_sock.getpeercert()
+                if not self._ValidateCertificateHostname(cert, self.host):
+                    raise http.CertificateHostnameMismatch(
+                        "Server presented certificate that does not match "
+                        "host %s: %s" % (self.host, cert), self.host, cert)
+            return tls_sock
+
+        def getresponse(self, *args, **kwargs):
+            response = TimedConnection.getresponse(self, *args, **kwargs)
+            if self.tls_sessions is not None and self.sock is not None:
+                # A TLS 1.3 server sends its session ticket after the
+                # handshake, so the session is only complete by now.
+                self.tls_sessions.save(self._session_key(), self.sock)
+            return response
+
+    return {'http': HTTPConnection, 'https': HTTPSConnection}
+
+
+CONNECTION_TYPES = build_connection_types()
+HTTPConnection = CONNECTION_TYPES['http']
+HTTPSConnection = CONNECTION_TYPES['https']
+
+
+def split_conn_key(conn_key):
+    """Turns an httplib2 "scheme:authority" key into (scheme, host, port)."""
+    scheme, authority = conn_key.split(':', 1)
+    if authority.startswith('['):
+        # IPv6 literal, e.g. "[::1]:8779".
+        host, _sep, port = authority.partition(']')
+        host += ']'
+        port = port[1:]
+    else:
+        host, _sep, port = authority.partition(':')
+    if port:
+        port = int(port)
+    else:
+        port = DEFAULT_PORTS.get(scheme)
+    return scheme, host.lower(), port
+
+
+def conn_key_for(uri):
+    """Returns the key httplib2 files the connection for ``uri`` under."""
+    scheme, authority, request_uri, defrag_uri = \
+        httplib2.urlnorm(httplib2.iri2uri(uri))
+    return scheme + ":" + authority
+
+
+class ConnectionPool(object):
+    """Keeps persistent keep-alive connections per (scheme, host, port).
+
+    :param maxsize: the most idle connections kept for a single host.
+    :param idle_timeout: seconds a connection may sit unused before it is
+                         closed instead of reused.
+    :param socket_options: (level, option, value) tuples set on every new
+                           socket, as accepted by ``socket.setsockopt``.
+    :param connection_types: {scheme: connection class} used to open new
+                             connections; see build_connection_types.
+    :param dns_cache: an optional DNSCache new connections resolve their
+                      host with.
+    :param tls_sessions: the TLSSessions HTTPS connections share; one is
+                         made if none is given.
+
+    A single pool may be shared by any number of clients; all access to the
+    idle lists is serialized. Clients may extend the key with whatever else
+    a connection must match to be reused, such as its TLS settings.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, socket_options=None,
+                 connection_types=None, dns_cache=None, tls_sessions=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        if socket_options is None:
+            socket_options = DEFAULT_SOCKET_OPTIONS
+        self.socket_options = list(socket_options)
+        self.connection_types = dict(connection_types or CONNECTION_TYPES)
+        self.dns_cache = dns_cache
+        if tls_sessions is None:
+            tls_sessions = TLSSessions()
+        self.tls_sessions = tls_sessions
+        self._idle = {}  # {(scheme, host, port): [(last_used, conn), ...]}
+        self._lock = threading.Lock()
+
+    def connection_type(self, scheme):
+        """Returns a factory httplib2 can use to open new connections."""
+        cls = self.connection_types[scheme]
+        options = self.socket_options
+
+        def factory(*args, **kwargs):
+            conn = cls(*args, **kwargs)
+            conn.socket_options = options
+            conn.dns_cache = self.dns_cache
+            conn.tls_sessions = self.tls_sessions
+            return conn
+        return factory
+
+    def acquire(self, key):
+        """Checks out the most recently used live connection for ``key``.
+
+        Returns None if there is no idle connection to reuse.
+        """
+        expired = []
+        conn = None
+        now = time.time()
+        self._lock.acquire()
+        try:
+            idle = self._idle.get(key)
+            if idle:
+                last_used, conn = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    # The newest connection is stale, so all of them are.
+                    expired = [conn] + [c for (t, c) in idle]
+                    del idle[:]
+                    conn = None
+        finally:
+            self._lock.release()
+        for stale in expired:
+            stale.close()
+        return conn
+
+    def release(self, key, conn):
+        """Returns a connection to the pool once a request is done with it.
+
+        Connections the server closed, and connections that do not fit into
+        the pool, are dropped.
+        """
+        if getattr(conn, 'sock', None) is None:
+            conn.close()
+            return
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append((time.time(), conn))
+                conn = None
+        finally:
+            self._lock.release()
+        if conn is not None:
+            conn.close()
+
+    def size(self, key=None):
+        """Returns the number of idle connections, optionally for one key."""
+        self._lock.acquire()
+        try:
+            if key is not None:
+                return len(self._idle.get(key, []))
+            return sum(len(idle) for idle in self._idle.values())
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Closes every idle connection."""
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, {}
+        finally:
+            self._lock.release()
+        for conns in idle.values():
+            for last_used, conn in conns:
+                conn.close()
@@ -0,0 +1,168 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Client side rate limiting.
+
+Requests are paced with token buckets so a busy client waits for capacity
+instead of being turned away with 413 Over Limit responses.
+"""
+
+import re
+import threading
+import time
+
+
+UNITS = {
+    'SECOND': 1,
+    'MINUTE': 60,
+    'HOUR': 60 * 60,
+    'DAY': 60 * 60 * 24,
+}
+
+# Requests per second allowed for a verb after a 413 it had no rule for.
+DEFAULT_ADAPTIVE_RATE = 1.0
+
+
+class TokenBucket(object):
+    """Allows ``rate`` requests per second with bursts of ``capacity``.
+
+    Callers reserve a token and are told how long to wait for it, so the
+    bucket never needs a background thread to refill.
+    """
+
+    def __init__(self, rate, capacity=None, max_rate=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        # The rate additive increase may climb back to; None is unbounded.
+        self.max_rate = max_rate
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.blocked_until = 0
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def reserve(self, now=None):
+        """Takes a token and returns the seconds to wait before using it."""
+        if now is None:
+            now = time.time()
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0
+        if self.tokens < 0:
+            wait = -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def slow_down(self, retry_after=None, now=None, factor=0.5):
+        """Cuts the rate after the server said we went over the limit."""
+        if now is None:
+            now = time.time()
+        self._refill(now)
+        self.rate = max(self.rate * factor, 1.0 / UNITS['DAY'])
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def speed_up(self, increase):
+        """Raises the rate a little after a request went through."""
+        rate = self.rate + increase
+        if self.max_rate is not None:
+            rate = min(rate, self.max_rate)
+        self.rate = rate
+
+
+class RateLimiter(object):
+    """
+    Token buckets per HTTP verb and URL pattern, shared by every manager.
+
+    Limits can be given up front with :meth:`add_limit`, loaded from the
+    rate limits the API publishes with :meth:`load_limits`, or learned: an
+    Over Limit response halves the rate of the buckets the request used
+    (creating one for the verb if there was none) and honours the server's
+    retry time, while each success raises the rate by ``increase`` requests
+    per second again, up to any limit given explicitly.
+    """
+
+    def __init__(self, increase=0.1, adaptive_rate=DEFAULT_ADAPTIVE_RATE):
+        self.increase = increase
+        self.adaptive_rate = adaptive_rate
+        self.rules = []  # [(verb, compiled regex, TokenBucket), ...]
+        self._lock = threading.Lock()
+
+    def add_limit(self, verb, regex, value, unit='MINUTE'):
+        """Allows ``value`` ``verb`` requests per ``unit`` to URLs matching
+        ``regex``. A verb of "*" matches every method."""
+        rate = float(value) / UNITS[unit.upper()]
+        bucket = TokenBucket(rate, capacity=max(1, value), max_rate=rate)
+        with self._lock:
+            self.rules.append((verb.upper(), re.compile(regex), bucket))
+        return bucket
+
+    def load_limits(self, limits):
+        """Adds the rate limits from a /limits document.
+
+        ``limits`` is the value of its "limits" key, as in::
+
+            {"rate": [{"regex": ".*", "uri": "*",
+                       "limit": [{"verb": "POST", "value": 10,
+                                  "unit": "MINUTE"}]}],
+             "absolute": {...}}
+        """
+        for rate in limits.get('rate', []):
+            regex = rate.get('regex', '.*')
+            for limit in rate.get('limit', []):
+                self.add_limit(limit['verb'], regex, limit['value'],
+                               limit.get('unit', 'MINUTE'))
+
+    def _buckets(self, method, url):
+        method = method.upper()
+        return [bucket for (verb, regex, bucket) in self.rules
+                if verb in ('*', method) and regex.search(url)]
+
+    def reserve(self, method, url):
+        """Reserves capacity for a request; returns the seconds to wait."""
+        with self._lock:
+            now = time.time()
+            waits = [bucket.reserve(now)
+                     for bucket in self._buckets(method, url)]
+        return max(waits or [0.0])
+
+    def acquire(self, method, url, sleep=time.sleep):
+        """Blocks, using ``sleep``, until a request may be sent."""
+        wait = self.reserve(method, url)
+        if wait > 0:
+            sleep(wait)
+
+    def over_limit(self, method, url, retry_after=None):
+        """Slows down the buckets a request that got a 413 went through."""
+        with self._lock:
+            buckets = self._buckets(method, url)
+            if not buckets:
+                bucket = TokenBucket(self.adaptive_rate)
+                self.rules.append((method.upper(), re.compile('.*'), bucket))
+                buckets = [bucket]
+            now = time.time()
+            for bucket in buckets:
+                bucket.slow_down(retry_after=retry_after, now=now)
+
+    def succeeded(self, method, url):
+        """Lets the buckets a successful request went through speed up."""
+        if not self.increase:
+            return
+        with self._lock:
+            for bucket in self._buckets(method, url):
+                bucket.speed_up(self.increase)
@@ -0,0 +1,133 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Retry policies for the HTTP client.
+"""
+
+import calendar
+import email.utils
+import httplib
+import inspect
+import random
+import socket
+import time
+
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# {status: max attempts}
+DEFAULT_STATUSES = {
+    408: 3,
+    413: 5,
+    500: 3,
+    502: 3,
+    503: 3,
+    504: 3,
+}
+
+# {exception class: max attempts}, for errors raised by the transport.
+DEFAULT_EXCEPTIONS = {
+    socket.error: 3,
+    httplib.HTTPException: 3,
+}
+
+
+def parse_retry_after(value, now=None):
+    """Returns the seconds to wait from a Retry-After or retryAfter value.
+
+    Accepts a number of seconds, an HTTP date or an ISO 8601 timestamp such
+    as the one in an overLimit body. Returns None for anything else.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if now is None:
+        now = time.time()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is not None:
+        return max(0.0, email.utils.mktime_tz(parsed) - now)
+    for fmt in ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            when = calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            continue
+        return max(0.0, when - now)
+    return None
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is tried again, and when.
+
+    :param statuses: {HTTP status: max attempts}.
+    :param exceptions: {exception class: max attempts} for connection level
+                       errors such as resets and timeouts. Subclasses match.
+    :param methods: the methods which may be retried. Only idempotent ones
+                    are by default, since a repeated POST may act twice.
+    :param backoff: the base delay in seconds, doubled on every attempt.
+    :param max_backoff: the longest delay the backoff will grow to.
+    :param jitter: if True the delay is picked at random between zero and
+                   the backoff ("full jitter"), so many clients failing at
+                   once do not retry in lockstep.
+
+    A delay asked for by the server through Retry-After, or the retryAfter
+    field of an overLimit body, is used instead of the backoff.
+    """
+
+    def __init__(self, statuses=None, exceptions=None,
+                 methods=IDEMPOTENT_METHODS, backoff=0.5, max_backoff=30,
+                 jitter=True):
+        if statuses is None:
+            statuses = DEFAULT_STATUSES
+        if exceptions is None:
+            exceptions = DEFAULT_EXCEPTIONS
+        self.statuses = dict(statuses)
+        self.exceptions = dict(exceptions)
+        self.methods = set(method.upper() for method in methods)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def max_attempts(self, status=None, error=None):
+        """The number of attempts allowed for a status or transport error."""
+        if error is not None:
+            for cls in inspect.getmro(error.__class__):
+                if cls in self.exceptions:
+                    return self.exceptions[cls]
+            return 1
+        return self.statuses.get(status, 1)
+
+    def should_retry(self, method, attempt, status=None, error=None):
+        """True if attempt number ``attempt`` should be followed by another.
+
+        ``error`` is the exception the transport raised, if any; otherwise
+        ``status`` is the HTTP status received.
+        """
+        if method.upper() not in self.methods:
+            return False
+        return attempt < self.max_attempts(status=status, error=error)
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the attempt after ``attempt``."""
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
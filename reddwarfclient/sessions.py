@@ -0,0 +1,106 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Login state which several clients can share.
+
+Each ReddwarfHTTPClient keeps its token, service URL and service catalog in
+an AuthSession. Clients given the same session log in once between them
+and use the same connection pool, while keeping their own settings such as
+timeouts, hooks and retry policies. The process wide ``registry`` hands out
+one session per login, which is what Dbaas(shared_session=True) uses.
+"""
+
+import threading
+
+
+class AuthSession(object):
+    """The token, service URL, catalog and connection pool of one login."""
+
+    def __init__(self, service_url=None, pool=None):
+        self.auth_token = None
+        self.service_url = service_url
+        # When auth_token expires, if the auth service said.
+        self.token_expires = None
+        # The auth.ServiceCatalog of the last login.
+        self.catalog = None
+        self.failover_urls = []
+        self.pool = pool
+        self.lock = threading.RLock()
+        # Held while logging in for want of a good token, so that threads
+        # which need to at the same time share one login.
+        self.login_lock = threading.Lock()
+        self.login_flights = 0
+        self.login_error = None
+        self.refresh_generation = 0
+        # The timer of the scheduled token refresh, if any.
+        self.refresh_timer = None
+        self.stats = {'logins': 0, 'shared': 0, 'failures': 0}
+
+    def __repr__(self):
+        return "<AuthSession %s>" % self.service_url
+
+
+def session_key(username, api_key, tenant=None, auth_url=None,
+                region_name=None, endpoint_type='publicURL', **options):
+    """Returns what a session is filed under in a SessionRegistry.
+
+    ``options`` are anything else that must match for two clients to share
+    a token and connections, such as the service type or whether
+    certificates are checked.
+    """
+    if auth_url:
+        auth_url = auth_url.rstrip('/')
+    return (username, api_key, tenant, auth_url, region_name,
+            endpoint_type, tuple(sorted(options.items())))
+
+
+class SessionRegistry(object):
+    """
+    Hands out one AuthSession per login.
+
+    A web tier which makes a Dbaas for every request can then log in, and
+    keep connections open, once per account rather than once per request.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory=AuthSession):
+        """Returns the session filed under ``key``, made by calling
+        ``factory`` the first time it is asked for."""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = factory()
+            return session
+
+    def discard(self, key):
+        """Forgets a session; clients already using it carry on."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __contains__(self, key):
+        return key in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+registry = SessionRegistry()
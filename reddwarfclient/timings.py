@@ -0,0 +1,102 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Bounded request timing logs.
+"""
+
+import collections
+
+
+DEFAULT_MAX_TIMINGS = 1000
+
+
+class Timing(tuple):
+    """
+    A ("METHOD url", start, end) tuple of one request.
+
+    ``phases`` breaks the request down as pool.TimedConnection does:
+    {"dns", "connect", "tls", "write", "ttfb", "read": seconds, "reused":
+    bool}. It is None if the connection did not time the request.
+    """
+
+    def __new__(cls, item, start, end, phases=None):
+        timing = tuple.__new__(cls, (item, start, end))
+        timing.phases = phases
+        return timing
+
+    def __repr__(self):
+        return "Timing(%r, %r, %r, phases=%r)" % (self + (self.phases,))
+
+
+class TimingLog(object):
+    """
+    Keeps the last ``maxlen`` ("METHOD url", start, end) tuples.
+
+    It can stand in for the list ReddwarfHTTPClient.times normally is: it is
+    appended to and iterated over the same way, but older entries are
+    dropped once it is full. Running totals over every request appended are
+    kept as well, so a long running process can still report on all of its
+    traffic. The client appends under its own lock.
+    """
+
+    def __init__(self, maxlen=DEFAULT_MAX_TIMINGS):
+        self.entries = collections.deque(maxlen=maxlen)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @property
+    def maxlen(self):
+        return self.entries.maxlen
+
+    def append(self, timing):
+        item, start, end = timing
+        elapsed = end - start
+        self.entries.append(timing)
+        self.count += 1
+        self.total += elapsed
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if self.max is None or elapsed > self.max:
+            self.max = elapsed
+
+    def summary(self):
+        """Returns the count, total, mean, min and max seconds of every
+        request appended."""
+        mean = None
+        if self.count:
+            mean = self.total / self.count
+        return {'count': self.count, 'total': self.total, 'mean': mean,
+                'min': self.min, 'max': self.max}
+
+    def clear(self):
+        self.entries.clear()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __repr__(self):
+        return "<TimingLog %d of %d requests>" % (len(self), self.count)
@@ -0,0 +1,192 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+An on-disk cache of auth tokens and service catalogs.
+
+Processes which log in with the same credentials share the token the first
+of them got until it expires, instead of each going to the auth service.
+"""
+
+import calendar
+import contextlib
+import errno
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not on Windows; concurrent logins are then not merged.
+
+from reddwarfclient import codec
+
+
+DEFAULT_PATH = os.path.expanduser("~/.reddwarfclient/tokens")
+
+# Seconds before it expires that a token stops being handed out.
+DEFAULT_MARGIN = 60
+
+# Seconds between attempts to take a lock held by another login.
+LOCK_POLL_INTERVAL = 0.05
+
+ISO_TIME = re.compile(r'^(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)'
+                      r'(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+
+def parse_expires(value):
+    """Turns a Keystone "expires" time into seconds since the epoch.
+
+    Accepts "2012-10-18T12:00:00Z" as well as fractions of a second and
+    offsets such as "-05:00". Returns None if ``value`` is not understood;
+    times without an offset are taken to be UTC.
+    """
+    match = ISO_TIME.match(value or '')
+    if match is None:
+        return None
+    fields = [int(field) for field in match.groups()[:6]]
+    seconds = calendar.timegm(fields + [0, 0, 0])
+    offset = match.group(7)
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        seconds -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return seconds
+
+
+def token_expires(body, root_key='access'):
+    """Returns when the token in an auth response body expires, or None."""
+    try:
+        return parse_expires(body[root_key]['token']['expires'])
+    except (KeyError, TypeError):
+        return None
+
+
+class TokenCache(object):
+    """
+    Keeps auth responses in files under ``path``, one per login.
+
+    A login is identified by its auth URL, user, tenant and region. Entries
+    are handed out until ``margin`` seconds before their token expires, and
+    tokens without an expiry time are not kept at all. Files are replaced
+    atomically and readable only by their owner. lock() lets processes
+    which find no entry wait for the one already logging in, rather than
+    all going to the auth service at once.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, margin=DEFAULT_MARGIN):
+        self.path = path
+        self.margin = margin
+        self._locks = {}  # {key: threading.Lock} for this process.
+        self._locks_lock = threading.Lock()
+
+    def key(self, auth_url, user, tenant, region, secret=None):
+        """Returns the name the login's entry is filed under.
+
+        The password or API key is part of it, so a process given the
+        wrong one cannot pick up the token of the right one.
+        """
+        login = u'\n'.join(unicode(part or u'') for part in
+                           (auth_url, user, tenant, region, secret))
+        return hashlib.sha1(login.encode('utf-8')).hexdigest()
+
+    def _file(self, key, suffix='.json'):
+        return os.path.join(self.path, key + suffix)
+
+    def _ensure_path(self):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path, 0700)
+            except OSError:
+                if not os.path.isdir(self.path):
+                    raise
+
+    def get(self, key):
+        """Returns the cached (body, root_key), or None if there is no
+        entry or its token is about to expire."""
+        try:
+            with open(self._file(key), 'rb') as entry_file:
+                entry = codec.default().loads(entry_file.read())
+            expires = entry['expires']
+            body, root_key = entry['body'], entry['root_key']
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+        if expires - self.margin <= time.time():
+            return None
+        return body, root_key
+
+    def put(self, key, body, root_key='access'):
+        """Caches an auth response body. Returns False if its token has no
+        expiry time, in which case it is not cached."""
+        expires = token_expires(body, root_key)
+        if expires is None:
+            return False
+        entry = codec.default().dumps({'expires': expires, 'body': body,
+                                       'root_key': root_key})
+        self._ensure_path()
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix='.token')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(entry)
+            os.rename(temp_path, self._file(key))
+        except:
+            os.unlink(temp_path)
+            raise
+        return True
+
+    def delete(self, key):
+        """Forgets a login, e.g. once its token has been rejected."""
+        try:
+            os.unlink(self._file(key))
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def lock(self, key, sleep=time.sleep):
+        """Holds an exclusive lock on a login across threads and processes.
+
+        The lock is waited for by trying it every LOCK_POLL_INTERVAL
+        seconds and calling ``sleep`` in between, never by blocking, so a
+        green thread waiting (given eventlet.sleep) lets the one logging in
+        get on with it.
+        """
+        with self._locks_lock:
+            local = self._locks.setdefault(key, threading.Lock())
+        while not local.acquire(False):
+            sleep(LOCK_POLL_INTERVAL)
+        try:
+            if fcntl is None:
+                yield
+                return
+            self._ensure_path()
+            with open(self._file(key, '.lock'), 'a') as lock_file:
+                while True:
+                    try:
+                        fcntl.flock(lock_file.fileno(),
+                                    fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except IOError, ex:
+                        if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                            raise
+                    sleep(LOCK_POLL_INTERVAL)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            local.release()
@@ -0,0 +1,212 @@
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Span based tracing of client calls.
+
+A span covers one step of the work done for a call, such as a manager
+method, a login, an HTTP request, parsing a response body or building a
+Resource. Spans started while another is open in the same thread become
+its children, so a trace shows where the time of a call went.
+"""
+
+import random
+import threading
+import time
+
+from reddwarfclient import codec
+
+
+def _new_id(bits):
+    return '%0*x' % (bits / 4, random.getrandbits(bits))
+
+
+class Span(object):
+    """One timed step of a trace. Used as a context manager."""
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = None
+        self.span_id = _new_id(64)
+        self.parent_id = None
+        self.start = None
+        self.end = None
+        self.error = None
+
+    def set(self, key, value):
+        """Adds an attribute, e.g. the status of a response."""
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            parent = stack[-1]
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        else:
+            self.trace_id = _new_id(128)
+        stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.time()
+        if exc_type is not None:
+            self.error = "%s: %s" % (exc_type.__name__, exc_value)
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer.finish(self)
+        return False
+
+    def to_dict(self):
+        return {'name': self.name, 'trace_id': self.trace_id,
+                'span_id': self.span_id, 'parent_id': self.parent_id,
+                'start': self.start, 'end': self.end,
+                'duration': self.duration, 'attributes': self.attributes,
+                'error': self.error}
+
+    def __repr__(self):
+        return "<Span %s %s>" % (self.name, self.span_id)
+
+
+class _NullSpan(object):
+    """Stands in for a span when there is no tracer."""
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """
+    Opens spans and hands the finished ones to an exporter.
+
+    The open spans are tracked per thread; AsyncDbaas makes them local to
+    each green thread instead.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def span(self, name, **attributes):
+        return Span(self, name, attributes)
+
+    def current(self):
+        """The innermost open span in this thread, or None."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def finish(self, span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+def span(tracer, name, **attributes):
+    """Opens a span on ``tracer``, or does nothing if it is None."""
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, **attributes)
+
+
+class JSONLinesExporter(object):
+    """Appends each finished span to a file as one line of JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = codec.default().dumps(span.to_dict())
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TracedManager(object):
+    """
+    Wraps a manager so each method call is traced.
+
+    A call to ``Instances.list`` opens an "Instances.list" span which the
+    spans of the logins, requests and Resources it causes are children of.
+    Attributes which are not methods, such as ``resource_class``, are passed
+    through. Resources the calls return are given the wrapper as their
+    manager, so ``instance.restart()`` is traced too.
+    """
+
+    def __init__(self, manager, tracer):
+        self.manager = manager
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        span_name = "%s.%s" % (self.manager.__class__.__name__, name)
+
+        def traced(*args, **kwargs):
+            with self.tracer.span(span_name):
+                result = attr(*args, **kwargs)
+            self._adopt(result)
+            return result
+        traced.__name__ = name
+        traced.__doc__ = attr.__doc__
+        return traced
+
+    def _adopt(self, result):
+        """Points the resources in ``result`` back at this wrapper."""
+        if getattr(result, 'manager', None) is self.manager:
+            # A Resource, or a StreamedPaginated yet to build them.
+            result.manager = self
+            return
+        if not isinstance(result, list):
+            # Paginated keeps its resources in a list of its own.
+            result = getattr(result, '__dict__', {}).get('items')
+            if not isinstance(result, list):
+                return
+        for item in result:
+            if getattr(item, 'manager', None) is self.manager:
+                item.manager = self
+
+    def __repr__(self):
+        return "<TracedManager %r>" % self.manager
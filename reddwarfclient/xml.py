@@ -1,6 +1,6 @@
 from lxml import etree
-import json
 from numbers import Number
+import StringIO
 
 from reddwarfclient import exceptions
 from reddwarfclient.client import ReddwarfHTTPClient
@@ -209,3 +209,29 @@ class ReddwarfXmlClient(ReddwarfHTTPClient):
         if links:
             result['links'] = links
         return result
+
+    def iter_response_list(self, body_string, response_key, extras):
+        """Yields the children of the root list element one at a time,
+        dropping each from the tree once it has been converted."""
+        depth = 0
+        root = None
+        try:
+            for event, element in etree.iterparse(
+                    StringIO.StringIO(body_string), events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        if normalize_tag(root) != response_key:
+                            raise KeyError(response_key)
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if normalize_tag(element) == "links":
+                    extras['links'] = element_to_list(element)
+                else:
+                    yield element_to_dict(element)
+                root.remove(element)
+        except etree.XMLSyntaxError:
+            raise exceptions.ResponseFormatError()
@@ -0,0 +1,94 @@
+from testtools import TestCase
+from reddwarfclient import auth
+from reddwarfclient import codec
+from reddwarfclient import exceptions
+
+
+def make_catalog_body():
+    def endpoint(node, region):
+        return {'region': region,
+                'publicURL': 'http://%s:8779/v1.0/tenant' % node,
+                'adminURL': 'http://%s:8779/v1.0/admin' % node}
+
+    return {'access': {
+        'token': {'id': 'token-id', 'expires': '2012-10-18T12:00:00Z'},
+        'serviceCatalog': [
+            {'type': 'compute', 'name': 'Nova',
+             'endpoints': [endpoint('nova', 'RegionOne')]},
+            {'type': 'reddwarf', 'name': 'Reddwarf',
+             'endpoints': [endpoint('east', 'RegionOne'),
+                           endpoint('west', 'RegionTwo')]},
+        ]}}
+
+
+class ServiceCatalogTest(TestCase):
+
+    def test_url_for_region(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionTwo',
+                                      service_type='reddwarf',
+                                      service_name='Reddwarf')
+        self.assertEqual('token-id', catalog.get_token())
+        self.assertEqual('http://west:8779/v1.0/tenant',
+                         catalog.get_public_url())
+        self.assertEqual('http://west:8779/v1.0/admin',
+                         catalog.get_management_url())
+
+    def test_get_urls_lists_local_region_first(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionTwo',
+                                      service_type='reddwarf',
+                                      service_name='Reddwarf')
+        self.assertEqual(['http://west:8779/v1.0/tenant',
+                          'http://east:8779/v1.0/tenant'],
+                         catalog.get_urls())
+        self.assertEqual(['http://west:8779/v1.0/admin',
+                          'http://east:8779/v1.0/admin'],
+                         catalog.get_urls('adminURL'))
+
+    def test_empty_service_name_matches_any(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionTwo',
+                                      service_type='reddwarf',
+                                      service_name='')
+        self.assertEqual('http://west:8779/v1.0/tenant',
+                         catalog.get_public_url())
+
+    def test_get_token_expires(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionTwo',
+                                      service_type='reddwarf',
+                                      service_name='Reddwarf')
+        self.assertEqual(1350561600, catalog.get_token_expires())
+
+    def test_catalog_is_not_changed(self):
+        body = make_catalog_body()
+        auth.ServiceCatalog(body, region='RegionOne',
+                            service_type='reddwarf', service_name='Reddwarf')
+        self.assertEqual(make_catalog_body(), body)
+
+    def test_ambiguous_without_region(self):
+        self.assertRaises(exceptions.AmbiguousEndpoints,
+                          auth.ServiceCatalog, make_catalog_body(),
+                          service_type='reddwarf', service_name='Reddwarf')
+
+    def test_lookups(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionOne',
+                                      service_type='reddwarf',
+                                      service_name='Reddwarf')
+        self.assertEqual(['RegionOne', 'RegionTwo'], catalog.get_regions())
+        self.assertEqual(['RegionOne'], catalog.get_regions('compute'))
+        self.assertEqual(['Nova', 'Reddwarf'],
+                         [endpoint['serviceName'] for endpoint in
+                          catalog.get_endpoints(region='RegionOne')])
+        self.assertEqual([], catalog.get_endpoints(interface='internalURL'))
+        self.assertEqual(['http://east:8779/v1.0/admin'],
+                         catalog.index.urls('adminURL', 'reddwarf',
+                                            region='RegionOne'))
+
+    def test_to_dict(self):
+        catalog = auth.ServiceCatalog(make_catalog_body(), region='RegionTwo',
+                                      service_type='reddwarf',
+                                      service_name='Reddwarf')
+        value = codec.default().loads(codec.default().dumps(
+            catalog.to_dict()))
+        copy = auth.ServiceCatalog.from_dict(value)
+        self.assertEqual(catalog.get_public_url(), copy.get_public_url())
+        self.assertEqual(catalog.index.endpoints, copy.index.endpoints)
+        self.assertEqual(catalog.get_urls(), copy.get_urls())
@@ -0,0 +1,83 @@
+import threading
+import time
+from testtools import TestCase
+from reddwarfclient import batch
+from reddwarfclient import exceptions
+
+
+class FakeManager(object):
+
+    def __init__(self):
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def get(self, item):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if item == 'missing':
+            raise exceptions.NotFound(404)
+        return item * 2
+
+
+class FakeDbaas(object):
+
+    def __init__(self):
+        self.instances = FakeManager()
+
+        class Mgmt(object):
+            pass
+        self.mgmt = Mgmt()
+        self.mgmt.instances = self.instances
+
+
+class BatchTest(TestCase):
+
+    def setUp(self):
+        super(BatchTest, self).setUp()
+        self.dbaas = FakeDbaas()
+
+    def test_results_are_ordered(self):
+        with batch.Batch(self.dbaas, max_concurrency=4) as calls:
+            for i in range(20):
+                calls.instances.get(i)
+        self.assertEqual([i * 2 for i in range(20)],
+                         [result.value for result in calls.results])
+        self.assertEqual([], calls.failures)
+
+    def test_bounded_concurrency(self):
+        with batch.Batch(self.dbaas, max_concurrency=3) as calls:
+            for i in range(12):
+                calls.instances.get(i)
+        self.assertTrue(self.dbaas.instances.most_running <= 3)
+
+    def test_failures_are_reported_per_call(self):
+        with batch.Batch(self.dbaas) as calls:
+            first = calls.instances.get(1)
+            missing = calls.mgmt.instances.get('missing')
+            last = calls.instances.get(3)
+        self.assertEqual(2, first.value)
+        self.assertEqual(6, last.value)
+        self.assertTrue(missing.failed)
+        self.assertTrue(isinstance(missing.exception, exceptions.NotFound))
+        self.assertEqual('mgmt.instances.get', missing.name)
+        self.assertEqual([missing], calls.failures)
+
+    def test_nothing_runs_if_block_raises(self):
+        queued = []
+
+        def queue_then_fail():
+            with batch.Batch(self.dbaas) as calls:
+                queued.append(calls.instances.get(1))
+                raise ValueError()
+        self.assertRaises(ValueError, queue_then_fail)
+        self.assertEqual(0, self.dbaas.instances.most_running)
+        self.assertFalse(queued[0].done)
+        self.assertEqual(None, queued[0].value)
+
+    def test_max_concurrency_must_be_positive(self):
+        self.assertRaises(ValueError, batch.Batch, self.dbaas, 0)
@@ -0,0 +1,55 @@
+from testtools import TestCase
+from reddwarfclient import cache
+
+
+class FakeResponse(dict):
+
+    def __init__(self, status, **headers):
+        super(FakeResponse, self).__init__(headers)
+        self.status = status
+
+
+class ResponseCacheTest(TestCase):
+
+    KEY = ('user', 'tenant', 'http://localhost/v1.0/tenant/flavors')
+
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        self.cache = cache.ResponseCache()
+
+    def test_stores_responses_with_validators(self):
+        body = {'flavors': []}
+        resp = FakeResponse(200, etag='"abc"')
+        self.assertTrue(body is self.cache.response_body(self.KEY, None,
+                                                         resp, body))
+        entry = self.cache.get(self.KEY)
+        self.assertEqual({'If-None-Match': '"abc"'},
+                         entry.conditional_headers())
+
+    def test_skips_responses_without_validators(self):
+        self.cache.response_body(self.KEY, None, FakeResponse(200), {})
+        self.assertEqual(None, self.cache.get(self.KEY))
+
+    def test_not_modified_returns_cached_body(self):
+        body = {'flavors': []}
+        resp = FakeResponse(200, **{'last-modified': 'Tue, 01 Jan 2013'})
+        self.cache.response_body(self.KEY, None, resp, body)
+        entry = self.cache.get(self.KEY)
+        self.assertEqual({'If-Modified-Since': 'Tue, 01 Jan 2013'},
+                         entry.conditional_headers())
+        cached = self.cache.response_body(self.KEY, entry,
+                                          FakeResponse(304), None)
+        self.assertTrue(cached is body)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_least_recently_used_entry_is_dropped(self):
+        small = cache.ResponseCache(max_entries=2)
+        resp = FakeResponse(200, etag='"1"')
+        small.store('a', resp, 'a')
+        small.store('b', resp, 'b')
+        small.get('a')
+        small.store('c', resp, 'c')
+        self.assertEqual(2, len(small))
+        self.assertEqual(None, small.get('b'))
+        self.assertEqual('a', small.get('a').body)
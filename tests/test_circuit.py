@@ -0,0 +1,123 @@
+from testtools import TestCase
+from reddwarfclient import circuit
+from reddwarfclient import client
+from reddwarfclient import exceptions
+
+
+class CircuitBreakerTest(TestCase):
+
+    URL = 'http://node1:8779/v1.0/tenant'
+
+    def setUp(self):
+        super(CircuitBreakerTest, self).setUp()
+        self.breaker = circuit.CircuitBreaker(failure_threshold=2,
+                                              cooldown=10)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure(self.URL, now=0)
+        self.assertEqual(circuit.CLOSED, self.breaker.state(self.URL))
+        self.breaker.record_failure(self.URL, now=0)
+        self.assertEqual(circuit.OPEN, self.breaker.state(self.URL))
+        self.assertFalse(self.breaker.allow(self.URL, now=5))
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure(self.URL, now=0)
+        self.breaker.record_success(self.URL)
+        self.breaker.record_failure(self.URL, now=0)
+        self.assertEqual(circuit.CLOSED, self.breaker.state(self.URL))
+
+    def test_half_open_probe(self):
+        self.breaker.record_failure(self.URL, now=0)
+        self.breaker.record_failure(self.URL, now=0)
+        self.assertTrue(self.breaker.allow(self.URL, now=11))
+        self.assertEqual(circuit.HALF_OPEN, self.breaker.state(self.URL))
+        # Only one probe at a time.
+        self.assertFalse(self.breaker.allow(self.URL, now=11))
+        self.breaker.record_failure(self.URL, now=11)
+        self.assertEqual(circuit.OPEN, self.breaker.state(self.URL))
+        self.assertFalse(self.breaker.allow(self.URL, now=12))
+        self.assertTrue(self.breaker.allow(self.URL, now=22))
+        self.breaker.record_success(self.URL)
+        self.assertEqual(circuit.CLOSED, self.breaker.state(self.URL))
+
+
+class FakeResponse(dict):
+
+    def __init__(self, status):
+        super(FakeResponse, self).__init__()
+        self.status = status
+
+
+class ClientFailoverTest(TestCase):
+
+    NODE1 = 'http://node1:8779/v1.0/tenant'
+    NODE2 = 'http://node2:8779/v1.0/tenant'
+
+    def setUp(self):
+        super(ClientFailoverTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake',
+            circuit_breaker=circuit.CircuitBreaker(failure_threshold=1),
+            failover=True)
+        self.client.failover_urls = [self.NODE1, self.NODE2]
+        self.calls = []
+
+    def _send(self, statuses):
+        def limited_request(service_url, url, method, **kwargs):
+            self.calls.append(service_url)
+            status = statuses[service_url]
+            if status == 'html':
+                # A proxy's error page, which is not JSON.
+                raise exceptions.ResponseFormatError()
+            if status >= 500:
+                raise exceptions.ClientException(status)
+            return FakeResponse(status), {}
+        self.client._limited_request = limited_request
+
+    def test_fails_over_and_then_fails_fast(self):
+        self._send({self.NODE1: 500, self.NODE2: 200})
+        resp, body = self.client._service_request(self.NODE1, '/flavors',
+                                                  'GET')
+        self.assertEqual(200, resp.status)
+        self.assertEqual([self.NODE1, self.NODE2], self.calls)
+        self.client._service_request(self.NODE1, '/flavors', 'GET')
+        # The open circuit skips node1 now.
+        self.assertEqual([self.NODE1, self.NODE2, self.NODE2], self.calls)
+
+    def test_post_does_not_fail_over(self):
+        self._send({self.NODE1: 500, self.NODE2: 200})
+        self.assertRaises(exceptions.ClientException,
+                          self.client._service_request, self.NODE1,
+                          '/instances', 'POST')
+        self.assertRaises(exceptions.CircuitOpen,
+                          self.client._service_request, self.NODE1,
+                          '/instances', 'POST')
+        self.assertEqual([self.NODE1], self.calls)
+
+    def test_client_errors_do_not_trip(self):
+        self._send({self.NODE1: 404})
+        self.client._service_request(self.NODE1, '/instances/1', 'GET')
+        self.assertEqual(circuit.CLOSED,
+                         self.client.circuit_breaker.state(self.NODE1))
+
+    def test_unparsable_errors_trip_and_end_the_probe(self):
+        self.client.circuit_breaker = circuit.CircuitBreaker(
+            failure_threshold=1, cooldown=0)
+        self._send({self.NODE1: 503})
+        self.assertRaises(exceptions.ClientException,
+                          self.client._service_request, self.NODE1,
+                          '/instances', 'POST')
+        # The half open probe gets an HTML 502.
+        self._send({self.NODE1: 'html'})
+        self.assertRaises(exceptions.ResponseFormatError,
+                          self.client._service_request, self.NODE1,
+                          '/instances', 'POST')
+        self.assertEqual(circuit.OPEN,
+                         self.client.circuit_breaker.state(self.NODE1))
+        self._send({self.NODE1: 200})
+        resp, body = self.client._service_request(self.NODE1, '/instances',
+                                                  'POST')
+        self.assertEqual(200, resp.status)
+        self.assertEqual(circuit.CLOSED,
+                         self.client.circuit_breaker.state(self.NODE1))
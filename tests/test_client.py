@@ -0,0 +1,607 @@
+import threading
+import time
+from testtools import TestCase
+from reddwarfclient import auth
+from reddwarfclient import client
+from reddwarfclient import exceptions
+from reddwarfclient import pool
+from reddwarfclient import sessions
+
+
+class ClientTest(TestCase):
+
+    def setUp(self):
+        super(ClientTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake')
+
+    def _in_thread(self, func):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_last_response_is_per_thread(self):
+        self.client.last_response = ('resp', 'body')
+        self.assertEqual(('resp', 'body'), self.client.last_response)
+        self.assertEqual(None,
+                         self._in_thread(lambda: self.client.last_response))
+
+    def test_connections_are_per_thread(self):
+        self.client.connections['http:localhost'] = object()
+        self.assertEqual({}, self._in_thread(lambda: self.client.connections))
+
+    def test_follow_all_redirects_override(self):
+        self.assertFalse(self.client.follow_all_redirects)
+        with self.client._redirects_for_request(True):
+            self.assertTrue(self.client.follow_all_redirects)
+            self.assertFalse(
+                self._in_thread(lambda: self.client.follow_all_redirects))
+        self.assertFalse(self.client.follow_all_redirects)
+
+    def test_authenticate_with_token(self):
+        self.assertEqual((None, None), self.client.get_auth_state())
+        self.assertRaises(exceptions.ServiceUrlNotGiven,
+                          self.client.authenticate_with_token, 'token')
+        self.client.authenticate_with_token('token', 'http://localhost')
+        self.assertEqual(('token', 'http://localhost'),
+                         self.client.get_auth_state())
+
+    def test_authenticate(self):
+        self.client.authenticate()
+        self.assertEqual(('tenant', 'http://localhost:8779/v1.0/tenant'),
+                         self.client.get_auth_state())
+
+
+class RotatingAuth(auth.Authenticator):
+    """Hands out token-1, token-2, ... each good for an hour."""
+
+    URL_REQUIRED = False
+    logins = 0
+    forgotten = 0
+    fail = False
+    repeat = False
+
+    def authenticate(self):
+        if self.fail:
+            raise exceptions.AuthorizationFailure()
+        if not self.repeat:
+            self.logins += 1
+        self.repeat = False
+        logins, expires = self.logins, time.time() + 3600
+
+        class Catalog(object):
+            def get_public_url(self):
+                return 'http://localhost:8779/v1.0/tenant'
+
+            def get_token(self):
+                return 'token-%d' % logins
+
+            def get_token_expires(self):
+                return expires
+        return Catalog()
+
+    def forget_token(self):
+        self.forgotten += 1
+
+
+class TokenRefreshTest(TestCase):
+
+    def setUp(self):
+        super(TokenRefreshTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', None, 'Reddwarf',
+            auth_strategy=RotatingAuth, auto_refresh=True)
+        self.scheduled = []
+        self.client.call_later = lambda delay, func: \
+            self.scheduled.append((delay, func))
+
+    def test_refresh_before_expiry(self):
+        self.client.authenticate()
+        self.assertEqual('token-1', self.client.auth_token)
+        [(delay, refresh)] = self.scheduled
+        self.assertTrue(3600 - 300 - 5 < delay <= 3600 - 300)
+        refresh()
+        self.assertEqual('token-2', self.client.auth_token)
+        self.assertEqual(2, len(self.scheduled))
+        # Only the latest scheduled refresh runs.
+        refresh()
+        self.assertEqual('token-2', self.client.auth_token)
+
+    def test_refresh_skips_a_cached_copy_of_the_same_token(self):
+        self.client.authenticate()
+        self.client.authenticator.repeat = True
+        self.client.refresh_token()
+        self.assertEqual('token-2', self.client.auth_token)
+        self.assertEqual(1, self.client.authenticator.forgotten)
+
+    def test_failed_refresh_is_retried(self):
+        self.client.authenticate()
+        self.client.authenticator.fail = True
+        self.client.refresh_token()
+        self.assertEqual('token-1', self.client.auth_token)
+        self.assertEqual(client.ReddwarfHTTPClient.REFRESH_RETRY,
+                         self.scheduled[-1][0])
+
+    def test_short_lived_tokens_refresh_halfway(self):
+        self.client.REFRESH_MARGIN = 3000
+        self.client.authenticate()
+        [(delay, refresh)] = self.scheduled
+        self.assertTrue(1800 - 5 < delay <= 1800)
+
+    def test_stop_refresh(self):
+        class Timer(object):
+            cancelled = False
+
+            def cancel(self):
+                self.cancelled = True
+        timer = Timer()
+
+        def call_later(delay, func):
+            self.scheduled.append((delay, func))
+            return timer
+        self.client.call_later = call_later
+        self.client.authenticate()
+        self.client.stop_refresh()
+        self.assertTrue(timer.cancelled)
+        self.scheduled[0][1]()
+        self.assertEqual('token-1', self.client.auth_token)
+        self.client.authenticate()
+        self.assertEqual(1, len(self.scheduled))
+
+    def test_off_by_default(self):
+        self.client.auto_refresh = False
+        self.client.authenticate()
+        self.assertEqual([], self.scheduled)
+        self.assertTrue(self.client.token_expires > time.time())
+
+
+class SlowAuth(auth.Authenticator):
+    """Takes a while to log in, so concurrent logins overlap."""
+
+    URL_REQUIRED = False
+    logins = 0
+    fail = False
+
+    def authenticate(self):
+        time.sleep(0.1)
+        self.logins += 1
+        if self.fail:
+            raise exceptions.AuthorizationFailure()
+        token = 'token-%d' % self.logins
+
+        class Catalog(object):
+            def get_public_url(self):
+                return 'http://localhost:8779/v1.0/tenant'
+
+            def get_token(self):
+                return token
+        return Catalog()
+
+
+class SingleFlightLoginTest(TestCase):
+
+    THREADS = 5
+
+    def setUp(self):
+        super(SingleFlightLoginTest, self).setUp()
+        from reddwarfclient.metrics import RequestMetrics
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', None, 'Reddwarf',
+            auth_strategy=SlowAuth, metrics=RequestMetrics())
+        self.client.authenticate_with_token('expired',
+                                            'http://localhost:8779/v1.0')
+
+        def service_request(service_url, url, method, **kwargs):
+            if kwargs['headers']['X-Auth-Token'] == 'expired':
+                raise exceptions.Unauthorized(401)
+            return None, kwargs['headers']['X-Auth-Token']
+        self.client._service_request = service_request
+
+    def _get_in_threads(self):
+        results = []
+
+        def get():
+            try:
+                results.append(self.client.get('/x')[1])
+            except Exception, ex:
+                results.append(ex)
+        threads = [threading.Thread(target=get)
+                   for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_rejected_threads_share_one_login(self):
+        results = self._get_in_threads()
+        self.assertEqual(['token-1'] * self.THREADS, results)
+        self.assertEqual(1, self.client.authenticator.logins)
+        self.assertEqual({'logins': 1, 'shared': self.THREADS - 1,
+                          'failures': 0}, self.client.get_auth_stats())
+        self.assertEqual(self.THREADS - 1, self.client.metrics.auth_shared)
+
+    def test_failure_goes_to_every_waiter(self):
+        self.client.authenticator.fail = True
+        results = self._get_in_threads()
+        self.assertEqual(self.THREADS, len(results))
+        for result in results:
+            self.assertTrue(isinstance(result,
+                                       exceptions.AuthorizationFailure))
+        self.assertEqual(1, self.client.authenticator.logins)
+        self.assertEqual(1, self.client.get_auth_stats()['failures'])
+        self.assertEqual(1, self.client.metrics.auth_failures)
+        # A later request tries again.
+        self.client.authenticator.fail = False
+        self.assertEqual('token-2', self.client.get('/x')[1])
+
+
+class SharedSessionTest(TestCase):
+
+    def setUp(self):
+        super(SharedSessionTest, self).setUp()
+        self.addCleanup(sessions.registry.clear)
+
+    def _dbaas(self, **kwargs):
+        return client.Dbaas('user', 'password', 'tenant',
+                            auth_strategy=RotatingAuth, shared_session=True,
+                            **kwargs)
+
+    def test_dbaas_objects_share_login_and_pool(self):
+        first = self._dbaas(timeout=5)
+        second = self._dbaas(timeout=30)
+        first.authenticate()
+        second.client._login()
+        self.assertEqual(('token-1', 'http://localhost:8779/v1.0/tenant'),
+                         second.client.get_auth_state())
+        self.assertEqual(1, second.client.get_auth_stats()['logins'])
+        self.assertTrue(first.client.pool is second.client.pool)
+        self.assertTrue(first.client.catalog is second.client.catalog)
+        self.assertEqual((5, 30),
+                         (first.client.timeout, second.client.timeout))
+        self.assertEqual(1, len(sessions.registry))
+
+    def test_service_url_is_kept(self):
+        url = 'http://localhost:8779/v1.0/other'
+        first = self._dbaas(service_url=url)
+        second = self._dbaas(service_url=url)
+        self.assertEqual(url, second.client.service_url)
+        first.authenticate()
+        self.assertEqual(('token-1', url), second.client.get_auth_state())
+
+    def test_other_logins_are_not_shared(self):
+        first = self._dbaas()
+        others = [self._dbaas(region_name='ORD'),
+                  client.Dbaas('user', 'password', 'tenant',
+                               auth_strategy=RotatingAuth)]
+        first.authenticate()
+        for other in others:
+            self.assertEqual((None, None), other.client.get_auth_state())
+            self.assertFalse(other.client.pool is first.client.pool)
+        self.assertEqual(2, len(sessions.registry))
+
+    def test_a_second_pool_is_ignored_with_a_warning(self):
+        warnings = []
+        self.patch(client._logger, 'warning',
+                   lambda *args: warnings.append(args))
+        first = self._dbaas()
+        second = self._dbaas(pool=pool.ConnectionPool())
+        self.assertTrue(first.client.pool is second.client.pool)
+        self.assertEqual(1, len(warnings))
+        self._dbaas(pool=first.client.pool)
+        self.assertEqual(1, len(warnings))
+
+    def test_client_options_are_passed_on(self):
+        options = {'response_cache': object(), 'retry_policy': object(),
+                   'rate_limiter': object(), 'circuit_breaker': object(),
+                   'metrics': object()}
+        dbaas = self._dbaas(**options)
+        for name, value in options.items():
+            self.assertTrue(getattr(dbaas.client, name) is value)
+
+
+class LeanClientTest(TestCase):
+
+    def test_lean_mode(self):
+        lean = client.Dbaas('user', 'password', 'tenant',
+                            'http://localhost:5000/v2.0',
+                            auth_strategy='fake', lean=True,
+                            max_timings=5)
+        self.assertFalse(lean.client.keep_last_response)
+        self.assertEqual(5, lean.get_timings().maxlen)
+
+    def test_defaults_keep_everything(self):
+        http = client.ReddwarfHTTPClient('user', 'password', 'tenant',
+                                         'http://localhost:5000/v2.0',
+                                         'Reddwarf', auth_strategy='fake')
+        self.assertTrue(http.keep_last_response)
+        self.assertEqual([], http.get_timings())
+
+
+class AsyncDbaasTest(TestCase):
+
+    def setUp(self):
+        super(AsyncDbaasTest, self).setUp()
+        try:
+            import eventlet
+        except ImportError:
+            self.skipTest("eventlet is not installed.")
+        self.dbaas = client.AsyncDbaas('user', 'password', 'tenant',
+                                       auth_strategy='fake')
+
+    def test_managers_return_green_threads(self):
+        body = {'instance': {'id': '1', 'name': 'one'}}
+        self.dbaas.client.get = lambda url: (None, body)
+        thread = self.dbaas.instances.get('1')
+        instance = thread.wait()
+        self.assertEqual('1', instance.id)
+        self.assertTrue(self.dbaas.mgmt.instances is self.dbaas.management)
+
+    def test_shared_session_keeps_its_green_pool(self):
+        self.addCleanup(sessions.registry.clear)
+        made = []
+        self.patch(client.AsyncDbaas, '_default_pool',
+                   lambda dbaas: made.append(dbaas) or pool.ConnectionPool())
+        first = client.AsyncDbaas('user', 'password', 'tenant',
+                                  auth_strategy='fake', shared_session=True)
+        second = client.AsyncDbaas('user', 'password', 'tenant',
+                                   auth_strategy='fake', shared_session=True)
+        self.assertEqual([first], made)
+        self.assertTrue(first.client.pool is second.client.pool)
+
+    def test_batch_runs_on_green_threads(self):
+        threads = []
+
+        def get(url):
+            threads.append(threading.current_thread())
+            return None, {'instance': {'id': url.split('/')[-1]}}
+        self.dbaas.client.get = get
+        with self.dbaas.batch(max_concurrency=2) as calls:
+            for instance_id in ('1', '2', '3'):
+                calls.instances.get(instance_id)
+        self.assertEqual(['1', '2', '3'],
+                         [result.value.id for result in calls.results])
+        self.assertEqual([threading.current_thread()] * 3, threads)
+
+    def test_errors_raise_on_wait(self):
+        def get(url):
+            raise exceptions.NotFound(404)
+        self.dbaas.client.get = get
+        thread = self.dbaas.instances.get('1')
+        self.assertRaises(exceptions.NotFound, thread.wait)
+
+
+class CompressionTest(TestCase):
+
+    def setUp(self):
+        super(CompressionTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake', compress_requests=True)
+
+    def test_small_bodies_are_sent_plain(self):
+        kwargs = {'headers': {}, 'body': '{}'}
+        self.assertTrue(self.client.compress_request(kwargs) is kwargs)
+
+    def test_large_bodies_are_gzipped(self):
+        import gzip
+        import StringIO
+        body = '{"databases": [%s]}' % ', '.join(['{"name": "db"}'] * 200)
+        kwargs = {'headers': {}, 'body': body}
+        compressed = self.client.compress_request(kwargs)
+        self.assertEqual('gzip', compressed['headers']['Content-Encoding'])
+        self.assertTrue(len(compressed['body']) < len(body))
+        unzipped = gzip.GzipFile(
+            fileobj=StringIO.StringIO(compressed['body'])).read()
+        self.assertEqual(body, unzipped)
+        # The original kwargs are kept for logging.
+        self.assertEqual(body, kwargs['body'])
+        self.assertEqual({}, kwargs['headers'])
+
+    def test_accept_encoding(self):
+        class Sent(Exception):
+            pass
+        offered = []
+
+        def before_request(headers, **kwargs):
+            offered.append(headers['Accept-Encoding'])
+            raise Sent()
+        self.client.add_hook('before_request', before_request)
+        self.assertRaises(Sent, self.client.request, 'http://localhost/x',
+                          'GET')
+        self.client.ACCEPT_ENCODING = None
+        self.assertRaises(Sent, self.client.request, 'http://localhost/x',
+                          'GET')
+        self.assertEqual(['gzip, deflate', 'identity'], offered)
+
+    def test_compression_is_opt_in(self):
+        self.client.compress_requests = False
+        kwargs = {'headers': {}, 'body': 'x' * 4096}
+        self.assertTrue(self.client.compress_request(kwargs) is kwargs)
+
+
+class StreamingListTest(TestCase):
+
+    BODY = ('{"instances": [{"id": "1", "name": "one"}, '
+            '{"id": "2", "name": "two"}], "links": [{"rel": "next", '
+            '"href": "http://localhost/instances?marker=2&limit=2"}]}')
+
+    def setUp(self):
+        super(StreamingListTest, self).setUp()
+        self.dbaas = client.Dbaas('user', 'password', 'tenant',
+                                  'http://localhost:5000/v2.0',
+                                  auth_strategy='fake')
+        self.requests = []
+
+        def get(url, **kwargs):
+            self.requests.append((url, kwargs))
+            return None, self.BODY
+        self.dbaas.client.get = get
+
+    def test_list_streams_instances(self):
+        page = self.dbaas.instances.list(limit=2, stream=True)
+        self.assertEqual([('/instances?limit=2', {'parse': False})],
+                         self.requests)
+        self.assertEqual(None, page.next)
+        self.assertEqual(['one', 'two'], [inst.name for inst in page])
+        self.assertEqual('2', page.next)
+        self.assertEqual(1, len(page.links))
+
+    def test_management_index_streams_instances(self):
+        page = self.dbaas.management.index(stream=True)
+        self.assertEqual(['1', '2'], [inst.id for inst in page])
+        self.assertEqual('2', page.next)
+
+
+class HooksTest(TestCase):
+
+    def setUp(self):
+        super(HooksTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake')
+        self.events = []
+        self.responses = []
+
+        def pooled_request(uri, method, **kwargs):
+            return self.responses.pop(0)
+        self.client._pooled_request = pooled_request
+
+    def _respond(self, status, body):
+        import httplib2
+        self.responses.append((httplib2.Response({'status': status}), body))
+
+    def _hook(self, hook_type):
+        def hook(**kwargs):
+            self.events.append((hook_type, kwargs))
+        self.client.add_hook(hook_type, hook)
+        return hook
+
+    def test_request_hooks(self):
+        for hook_type in client.ReddwarfHTTPClient.HOOK_TYPES:
+            self._hook(hook_type)
+        self._respond(200, '{"a": 1}')
+        resp, body = self.client.request('http://localhost/x', 'POST',
+                                         body={'b': 2})
+        self.assertEqual({'a': 1}, body)
+        self.assertEqual(['before_request', 'after_response'],
+                         [hook_type for hook_type, _ in self.events])
+        before, after = self.events[0][1], self.events[1][1]
+        self.assertEqual(('POST', 'http://localhost/x', '{"b":2}'),
+                         (before['method'], before['url'], before['body']))
+        self.assertEqual((200, '{"a": 1}', 7, 8),
+                         (after['resp'].status, after['response_body'],
+                          after['bytes_out'], after['bytes_in']))
+        self.assertTrue(after['elapsed'] >= 0)
+
+    def test_on_error(self):
+        self._hook('on_error')
+        self._respond(404, '{"itemNotFound": {"message": "no"}}')
+        self.assertRaises(exceptions.NotFound, self.client.request,
+                          'http://localhost/x', 'GET')
+        [(hook_type, event)] = self.events
+        self.assertTrue(isinstance(event['error'], exceptions.NotFound))
+        self.assertEqual(None, event['transport_error'])
+
+    def test_on_retry(self):
+        from reddwarfclient.retry import RetryPolicy
+        self._hook('on_retry')
+        self.client.retry_policy = RetryPolicy(backoff=0)
+        self.client.sleep = lambda seconds: None
+        self.client.authenticate_with_token('token', 'http://localhost')
+        self._respond(503, '')
+        self._respond(200, '{}')
+        self.client.get('/x')
+        [(hook_type, event)] = self.events
+        self.assertEqual(('GET', '/x', 1, 503, None),
+                         (event['method'], event['url'], event['attempt'],
+                          event['status'], event['error']))
+
+    def test_on_auth(self):
+        self._hook('on_auth')
+        self.client.authenticate()
+        [(hook_type, event)] = self.events
+        self.assertEqual('http://localhost:8779/v1.0/tenant',
+                         event['service_url'])
+
+    def test_add_and_remove(self):
+        self.assertRaises(ValueError, self.client.add_hook, 'nope', None)
+        hook = self._hook('on_auth')
+        self.client.remove_hook('on_auth', hook)
+        self.assertFalse('on_auth' in self.client._hooks)
+
+
+class DebugLogTest(TestCase):
+
+    def setUp(self):
+        super(DebugLogTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake')
+
+    def test_headers_are_redacted(self):
+        command = self.client._curl_command(
+            ('http://localhost/x', 'GET'),
+            {'X-Auth-Token': 'secret', 'Accept': 'application/json'})
+        self.assertFalse('secret' in command)
+        self.assertTrue('-H "X-Auth-Token: ***"' in command)
+        self.assertTrue('-H "Accept: application/json"' in command)
+
+    def test_credentials_in_bodies_are_redacted(self):
+        self.client.auth_token = 'tok-1234'
+        for body in ['{"auth": {"passwordCredentials": {"username": "u", '
+                     '"password": "secret"}}}',
+                     '{"credentials": {"username": "u", "key": "secret"}}',
+                     '{"access": {"token": {"expires": "x", '
+                     '"id": "secret"}}}',
+                     '{"access": {"token": {"expires": "x", "tenant": '
+                     '{"id": "t1"}, "id": "secret"}}}',
+                     '<credentials username="u" key="secret"/>',
+                     '<access><token expires="x" id="secret"/></access>',
+                     '{"instance": {"id": "1", "token": "secret"}}'.replace(
+                         '"secret"', '"tok-1234"')]:
+            logged = self.client._log_body(body)
+            self.assertFalse('secret' in logged or 'tok-1234' in logged,
+                             logged)
+        self.assertEqual('{"instance": {"id": "1"}}',
+                         self.client._log_body('{"instance": {"id": "1"}}'))
+
+    def test_large_bodies_are_cut(self):
+        self.client.LOG_BODY_LIMIT = 20
+        body = '{"password": "' + 'x' * 100 + '"}'
+        self.assertEqual('{"password": "***... (116 bytes)',
+                         self.client._log_body(body, pretty=True))
+        self.assertEqual('{\n    "a": 1\n}',
+                         self.client._log_body('{"a": 1}', pretty=True))
+
+    def test_large_bodies_are_not_decoded(self):
+        decoded = []
+
+        class Codec(object):
+            def loads(self, string):
+                decoded.append(string)
+                return {}
+        self.client.json_codec = Codec()
+        self.client.LOG_BODY_LIMIT = 20
+        self.assertEqual('{"instances": [{"id"... (30 bytes)',
+                         self.client._log_body('{"instances": [{"id": "1"}]}'
+                                               '  ', pretty=True))
+        self.assertEqual([], decoded)
+
+    def test_sampling(self):
+        import httplib2
+        self.client.LOG_SAMPLE_RATE = 0
+        self.assertFalse(self.client._log_sampled(
+            httplib2.Response({'status': 200})))
+        self.assertTrue(self.client._log_sampled(
+            httplib2.Response({'status': 500})))
+
+    def test_formatting_is_lazy(self):
+        calls = []
+        lazy = client._Lazy(lambda value: calls.append(value) or value, 'a')
+        self.assertEqual([], calls)
+        self.assertEqual('a', str(lazy))
+        self.assertEqual(['a'], calls)
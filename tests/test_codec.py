@@ -0,0 +1,60 @@
+import os
+from testtools import TestCase
+from reddwarfclient import codec
+
+
+class CodecTest(TestCase):
+
+    BODY = {'instances': [{'id': '1', 'name': 'one', 'links': []}]}
+
+    def test_every_codec_round_trips(self):
+        for name, json_codec in codec.codecs.commands.items():
+            wire = json_codec.dumps(self.BODY)
+            self.assertFalse(', ' in wire or ': ' in wire, name)
+            self.assertEqual(self.BODY, json_codec.loads(wire))
+            self.assertRaises(ValueError, json_codec.loads, '<xml/>')
+
+    def test_pretty(self):
+        pretty = codec.get_codec('json').pretty({'b': 1, 'a': 2})
+        self.assertEqual('{\n    "a": 2, \n    "b": 1\n}',
+                         pretty.replace(',\n', ', \n'))
+
+    def test_default_prefers_the_fastest(self):
+        self.assertTrue(codec.default() is codec.fastest())
+        self.assertEqual(codec.fastest().name,
+                         [name for name in codec.PREFERENCE
+                          if codec.codecs.get(name)][0])
+
+    def test_default_from_environment(self):
+        os.environ['REDDWARFCLIENT_JSON'] = 'json'
+        try:
+            self.assertEqual('json', codec.default().name)
+            os.environ['REDDWARFCLIENT_JSON'] = 'nope'
+            self.assertRaises(ValueError, codec.default)
+        finally:
+            del os.environ['REDDWARFCLIENT_JSON']
+
+    def test_iter_list(self):
+        body = ('{"links": [{"rel": "next", "href": "x"}], "instances": '
+                '[{"id": "1", "tags": [1, 2]}, {"id": "2"}], "extra": {}}')
+        for name, json_codec in codec.codecs.commands.items():
+            extras = {}
+            items = json_codec.iter_list(body, 'instances', extras)
+            self.assertEqual({'id': '1', 'tags': [1, 2]}, items.next())
+            self.assertEqual([{'id': '2'}], list(items))
+            self.assertEqual({'links': [{'rel': 'next', 'href': 'x'}],
+                              'extra': {}}, extras)
+
+    def test_iter_list_empty_and_missing(self):
+        json_codec = codec.get_codec('json')
+        self.assertEqual([], list(json_codec.iter_list(' { "a" : [ ] } ',
+                                                       'a')))
+        self.assertRaises(KeyError, list, json_codec.iter_list('{}', 'a'))
+        self.assertRaises(KeyError, list,
+                          json_codec.iter_list('{"b": [1]}', 'a'))
+
+    def test_iter_list_malformed(self):
+        json_codec = codec.get_codec('json')
+        for body in ('[1]', '{"a": [1, 2', '{"a": [1 2]}', '{"a" [1]}'):
+            self.assertRaises(ValueError, list,
+                              json_codec.iter_list(body, 'a'))
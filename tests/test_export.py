@@ -0,0 +1,126 @@
+import os
+import shutil
+import socket
+import tempfile
+import urllib2
+from testtools import TestCase
+from reddwarfclient import export
+from reddwarfclient.metrics import RequestMetrics
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.metrics = RequestMetrics()
+        self.metrics.record('GET', '/instances/{id}', 200, 0.02,
+                            bytes_in=300)
+        self.metrics.record('GET', '/instances/{id}', 404, 0.2, bytes_in=20)
+        self.metrics.record_retry('GET', '/instances/{id}')
+        self.metrics.record_auth()
+        self.metrics.record_auth_shared()
+        self.metrics.request_started()
+
+    def test_prometheus_text(self):
+        text = export.prometheus_text(self.metrics, prefix='rdc')
+        lines = text.splitlines()
+        self.assertTrue('# TYPE rdc_request_duration_seconds histogram'
+                        in lines)
+        for line in [
+                'rdc_requests_total{method="GET",route="/instances/{id}",'
+                'status="404"} 1',
+                'rdc_request_errors_total{method="GET",'
+                'route="/instances/{id}",status="404"} 1',
+                'rdc_request_duration_seconds_bucket{le="0.025",'
+                'method="GET",route="/instances/{id}"} 1',
+                'rdc_request_duration_seconds_bucket{le="+Inf",'
+                'method="GET",route="/instances/{id}"} 2',
+                'rdc_request_duration_seconds_count{method="GET",'
+                'route="/instances/{id}"} 2',
+                'rdc_response_bytes_total{method="GET",'
+                'route="/instances/{id}"} 320',
+                'rdc_retries_total{method="GET",route="/instances/{id}"} 1',
+                'rdc_auth_refreshes_total 1',
+                'rdc_auth_shared_total 1',
+                'rdc_auth_failures_total 0',
+                'rdc_requests_in_flight 1']:
+            self.assertTrue(line in lines, line)
+
+    def test_label_escaping(self):
+        self.assertEqual('{a="x\\"y\\\\z\\n"}', export._labels(a='x"y\\z\n'))
+
+    def test_write_textfile(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'reddwarf.prom')
+        export.write_textfile(self.metrics, path)
+        self.assertEqual(export.prometheus_text(self.metrics),
+                         open(path).read())
+        self.assertEqual(['reddwarf.prom'], os.listdir(directory))
+
+    def test_serve(self):
+        server = export.serve(self.metrics)
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+        response = urllib2.urlopen(url)
+        self.assertEqual(export.PROMETHEUS_CONTENT_TYPE,
+                         response.info()['content-type'])
+        self.assertEqual(export.prometheus_text(self.metrics),
+                         response.read())
+
+
+class StatsdExporterTest(TestCase):
+
+    def test_lines_are_deltas(self):
+        metrics = RequestMetrics()
+        exporter = export.StatsdExporter(metrics, prefix='rdc')
+        self.assertEqual(['rdc.in_flight:0|g'], exporter.lines())
+        metrics.record('POST', '/instances/{id}/action', 202, 0.05,
+                       bytes_out=40)
+        metrics.record_auth()
+        lines = exporter.lines()
+        self.assertEqual(['rdc.requests.POST.instances_id_action.202:1|c',
+                          'rdc.bytes_out.POST.instances_id_action:40|c'],
+                         lines[:2])
+        self.assertEqual(['rdc.auth_refreshes:1|c', 'rdc.in_flight:0|g'],
+                         lines[-2:])
+        for line, percent in zip(lines[2:5], (50, 95, 99)):
+            name, value = line[:-len('|g')].split(':')
+            self.assertEqual('rdc.latency.POST.instances_id_action.p%d'
+                             % percent, name)
+            # Within the histogram's precision of 50ms.
+            self.assertTrue(49 <= int(value) <= 51, line)
+        self.assertEqual(['rdc.in_flight:0|g'], exporter.lines())
+
+    def test_send(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        metrics = RequestMetrics()
+        exporter = export.StatsdExporter(
+            metrics, port=receiver.getsockname()[1], max_packet=100)
+        for status in (200, 201):
+            metrics.record('GET', '/flavors', status, 0.01)
+        exporter.send()
+        packets = []
+        while True:
+            packets.append(receiver.recv(1024))
+            if 'in_flight' in packets[-1]:
+                break
+        self.assertTrue(len(packets) > 1)
+        self.assertTrue(all(len(packet) <= 100 for packet in packets))
+        self.assertTrue('reddwarfclient.requests.GET.flavors.200:1|c'
+                        in '\n'.join(packets).splitlines())
+
+    def test_start_and_stop(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        exporter = export.StatsdExporter(
+            RequestMetrics(), port=receiver.getsockname()[1])
+        exporter.start(interval=0.01)
+        self.assertTrue('in_flight' in receiver.recv(1024))
+        exporter.stop()
+        self.assertEqual(None, exporter._thread)
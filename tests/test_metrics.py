@@ -0,0 +1,90 @@
+from testtools import TestCase
+from reddwarfclient import metrics
+
+
+class RouteTemplateTest(TestCase):
+
+    def test_identifiers_are_replaced(self):
+        service = "http://host:8779/v1.0/1234"
+        self.assertEqual("/instances/{id}/action",
+                         metrics.route_template(
+                             service + "/instances/5a6b-7c/action?x=1",
+                             [None, service]))
+        self.assertEqual("/mgmt/hosts/{id}/instances/action",
+                         metrics.route_template(
+                             service + "/mgmt/hosts/host1/instances/action",
+                             [service]))
+        self.assertEqual("/instances",
+                         metrics.route_template(service + "/instances",
+                                                [service]))
+
+    def test_without_a_prefix_the_path_is_used(self):
+        self.assertEqual("/v2.0/tokens", metrics.route_template(
+            "http://auth:5000/v2.0/tokens"))
+        self.assertEqual("/", metrics.route_template("http://auth:5000"))
+
+
+class HistogramTest(TestCase):
+
+    def test_percentiles_are_within_precision(self):
+        histogram = metrics.Histogram(precision=0.01)
+        for ms in range(1, 1001):
+            histogram.record(ms / 1000.0)
+        for percent, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            value = histogram.percentile(percent)
+            self.assertTrue(abs(value - expected) <= expected * 0.01,
+                            (percent, value))
+        self.assertEqual(1.0, histogram.percentile(100))
+        self.assertTrue(abs(histogram.percentile(0) - 0.001) <= 0.00001)
+        self.assertTrue(len(histogram.buckets) < 1000)
+
+    def test_empty(self):
+        histogram = metrics.Histogram()
+        self.assertEqual(None, histogram.percentile(50))
+        self.assertEqual(None, histogram.mean())
+
+    def test_merge(self):
+        first = metrics.Histogram()
+        second = metrics.Histogram()
+        first.record(0.1)
+        second.record(0.3)
+        second.record(0.0)
+        first.merge(second)
+        self.assertEqual(3, first.count)
+        self.assertEqual(0.0, first.min)
+        self.assertEqual(0.3, first.max)
+        self.assertRaises(ValueError, first.merge, metrics.Histogram(0.1))
+
+
+class RequestMetricsTest(TestCase):
+
+    def test_report(self):
+        request_metrics = metrics.RequestMetrics()
+        request_metrics.record('GET', '/instances/{id}', 200, 0.1,
+                               bytes_in=100)
+        request_metrics.record('GET', '/instances/{id}', 404, 0.2,
+                               bytes_in=50)
+        request_metrics.record('POST', '/instances', 500, 0.3,
+                               bytes_out=10, error=True)
+        request_metrics.record('POST', '/instances', 202, 0.4, error=True)
+        self.assertEqual(4, len(request_metrics.stats))
+        get, post = request_metrics.report()
+        self.assertEqual(('GET', '/instances/{id}', 2, 1, 150, 0),
+                         (get['method'], get['route'], get['count'],
+                          get['errors'], get['bytes_in'], get['bytes_out']))
+        self.assertEqual(('POST', '/instances', 2, 2, 10),
+                         (post['method'], post['route'], post['count'],
+                          post['errors'], post['bytes_out']))
+        self.assertEqual(0.4, post['p99'])
+
+    def test_merge(self):
+        first = metrics.RequestMetrics()
+        second = metrics.RequestMetrics()
+        first.record('GET', '/flavors', 200, 0.1)
+        second.record('GET', '/flavors', 200, 0.2)
+        second.record('GET', '/limits', 200, 0.2)
+        first.merge(second)
+        self.assertEqual(2, first.stats[('GET', '/flavors', 200)].count)
+        self.assertEqual(2, len(first.report()))
+        first.clear()
+        self.assertEqual([], first.report())
@@ -0,0 +1,377 @@
+import BaseHTTPServer
+import SocketServer
+import os
+import ssl
+import threading
+import time
+from testtools import TestCase
+from reddwarfclient import client
+from reddwarfclient import exceptions
+from reddwarfclient import pool
+
+
+# A self-signed certificate for localhost and 127.0.0.1, with its key.
+CERT = os.path.join(os.path.dirname(__file__), 'localhost.pem')
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.sock = object()
+        self.closed = False
+
+    def close(self):
+        self.sock = None
+        self.closed = True
+
+
+class PoolTest(TestCase):
+
+    KEY = ('https', 'dbaas.example.com', 443)
+
+    def test_split_conn_key(self):
+        self.assertEqual(('http', 'localhost', 8779),
+                         pool.split_conn_key('http:localhost:8779'))
+        self.assertEqual(('https', 'example.com', 443),
+                         pool.split_conn_key('https:Example.com'))
+        self.assertEqual(('http', '[::1]', 8779),
+                         pool.split_conn_key('http:[::1]:8779'))
+        self.assertEqual(('http', '[::1]', 80),
+                         pool.split_conn_key('http:[::1]'))
+
+    def test_conn_key_for(self):
+        self.assertEqual('http:localhost:8779',
+                         pool.conn_key_for('http://localhost:8779/v1.0/x'))
+
+    def test_acquire_empty(self):
+        connections = pool.ConnectionPool()
+        self.assertEqual(None, connections.acquire(self.KEY))
+
+    def test_release_and_reuse(self):
+        connections = pool.ConnectionPool()
+        first, second = FakeConnection(), FakeConnection()
+        connections.release(self.KEY, first)
+        connections.release(self.KEY, second)
+        self.assertEqual(2, connections.size(self.KEY))
+        # Most recently used comes back first.
+        self.assertTrue(connections.acquire(self.KEY) is second)
+        self.assertTrue(connections.acquire(self.KEY) is first)
+        self.assertEqual(None, connections.acquire(self.KEY))
+
+    def test_closed_connections_are_dropped(self):
+        connections = pool.ConnectionPool()
+        conn = FakeConnection()
+        conn.close()
+        connections.release(self.KEY, conn)
+        self.assertEqual(0, connections.size())
+
+    def test_maxsize(self):
+        connections = pool.ConnectionPool(maxsize=1)
+        kept, extra = FakeConnection(), FakeConnection()
+        connections.release(self.KEY, kept)
+        connections.release(self.KEY, extra)
+        self.assertEqual(1, connections.size(self.KEY))
+        self.assertFalse(kept.closed)
+        self.assertTrue(extra.closed)
+
+    def test_idle_timeout(self):
+        connections = pool.ConnectionPool(idle_timeout=0)
+        conn = FakeConnection()
+        connections.release(self.KEY, conn)
+        time.sleep(0.01)
+        self.assertEqual(None, connections.acquire(self.KEY))
+        self.assertTrue(conn.closed)
+
+    def test_clear(self):
+        connections = pool.ConnectionPool()
+        conn = FakeConnection()
+        connections.release(self.KEY, conn)
+        connections.clear()
+        self.assertEqual(0, connections.size())
+        self.assertTrue(conn.closed)
+
+    def test_connection_type_sets_socket_options(self):
+        options = [(1, 2, 3)]
+        connections = pool.ConnectionPool(socket_options=options)
+        conn = connections.connection_type('http')('localhost:8779')
+        self.assertTrue(isinstance(conn, pool.HTTPConnection))
+        self.assertEqual(options, conn.socket_options)
+
+
+class DNSCacheTest(TestCase):
+
+    def setUp(self):
+        super(DNSCacheTest, self).setUp()
+        self.lookups = []
+
+    def getaddrinfo(self, host, port, family, socktype):
+        self.lookups.append((host, port))
+        return [(2, 1, 6, '', ('127.0.0.1', port))]
+
+    def test_resolve_is_cached(self):
+        cache = pool.DNSCache()
+        for i in range(2):
+            self.assertEqual([(2, 1, 6, '', ('127.0.0.1', 80))],
+                             cache.resolve('example.com', 80,
+                                           self.getaddrinfo))
+        self.assertEqual([('example.com', 80)], self.lookups)
+        self.assertTrue(('example.com', 80) in cache)
+        cache.forget('example.com', 80)
+        self.assertFalse(('example.com', 80) in cache)
+
+    def test_ttl(self):
+        cache = pool.DNSCache(ttl=0)
+        cache.resolve('example.com', 80, self.getaddrinfo)
+        time.sleep(0.01)
+        cache.resolve('example.com', 80, self.getaddrinfo)
+        self.assertEqual(2, len(self.lookups))
+
+    def test_connection_type_uses_cache(self):
+        cache = pool.DNSCache()
+        connections = pool.ConnectionPool(dns_cache=cache)
+        conn = connections.connection_type('http')('localhost:8779')
+        self.assertTrue(conn.dns_cache is cache)
+
+
+class FakeContext(object):
+
+    check_hostname = True
+    verify_mode = 'CERT_REQUIRED'
+
+    def __init__(self, cafile):
+        self.cafile = cafile
+
+
+class FakeSSL(object):
+
+    CERT_NONE = 'CERT_NONE'
+
+    def __init__(self):
+        self.contexts = []
+
+    def create_default_context(self, cafile=None):
+        self.contexts.append(FakeContext(cafile))
+        return self.contexts[-1]
+
+
+class FakeTLSSocket(object):
+
+    def __init__(self, session, session_reused=False):
+        self.session = session
+        self.session_reused = session_reused
+
+
+class TLSSessionsTest(TestCase):
+
+    KEY = ('dbaas.example.com', 443, True)
+
+    def test_contexts_are_shared(self):
+        ssl, sessions = FakeSSL(), pool.TLSSessions()
+        context = sessions.context(ssl, 'ca.pem', True)
+        self.assertTrue(sessions.context(ssl, 'ca.pem', True) is context)
+        self.assertEqual('ca.pem', context.cafile)
+        insecure = sessions.context(ssl, 'ca.pem', False)
+        self.assertFalse(insecure.check_hostname)
+        self.assertEqual('CERT_NONE', insecure.verify_mode)
+        self.assertEqual(2, len(ssl.contexts))
+
+    def test_sessions_are_offered_and_counted(self):
+        sessions = pool.TLSSessions()
+        self.assertEqual(None, sessions.session(self.KEY))
+        sessions.handshake_done(self.KEY, FakeTLSSocket('first'))
+        self.assertEqual('first', sessions.session(self.KEY))
+        # Never offered to a connection which does not validate.
+        self.assertEqual(None, sessions.session(self.KEY[:2] + (False,)))
+        sessions.handshake_done(self.KEY, FakeTLSSocket('first', True))
+        sessions.save(self.KEY, FakeTLSSocket('ticket'))
+        self.assertEqual('ticket', sessions.session(self.KEY))
+        self.assertEqual({'resumed': 1, 'full': 1}, sessions.stats())
+        sessions.clear()
+        self.assertEqual(None, sessions.session(self.KEY))
+
+    def test_without_session_support(self):
+        sessions = pool.TLSSessions()
+        sessions.handshake_done(self.KEY, object())
+        self.assertEqual({'resumed': 0, 'full': 1}, sessions.stats())
+        self.assertEqual(None, sessions.session(self.KEY))
+
+    def test_connection_type_shares_sessions(self):
+        connections = pool.ConnectionPool()
+        conn = connections.connection_type('https')('localhost:8779')
+        self.assertTrue(conn.tls_sessions is connections.tls_sessions)
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = '{"instance": {"id": "1"}}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingServer(SocketServer.ThreadingMixIn,
+                      BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+
+class LoopbackTest(TestCase):
+
+    def setUp(self):
+        super(LoopbackTest, self).setUp()
+        self.server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def _exchange(self, conn):
+        conn.start_timing()
+        conn.request('GET', '/')
+        conn.getresponse().read()
+        return conn.finish_timing()
+
+    def test_phases(self):
+        conn = pool.HTTPConnection('127.0.0.1', self.port)
+        self.addCleanup(conn.close)
+        first = self._exchange(conn)
+        self.assertFalse(first['reused'])
+        self.assertEqual(set(pool.PHASES + ('reused',)), set(first))
+        self.assertTrue(first['connect'] > 0)
+        self.assertEqual(0.0, first['tls'])
+        self.assertTrue(first['ttfb'] > 0)
+        second = self._exchange(conn)
+        self.assertTrue(second['reused'])
+        self.assertEqual(0.0, second['dns'] + second['connect'])
+        self.assertEqual(None, conn.finish_timing())
+
+    def _client(self, **kwargs):
+        http = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', None, 'Reddwarf',
+            service_url='http://127.0.0.1:%d' % self.port,
+            auth_strategy='fake', **kwargs)
+        self.addCleanup(http.pool.clear)
+        return http
+
+    def test_client_timings(self):
+        http = self._client()
+        http.authenticate_with_token('token')
+        timings = []
+        http.add_hook('after_response',
+                      lambda **kwargs: timings.append(kwargs['timing']))
+        http.get('/instances/1')
+        http.get('/instances/1')
+        self.assertEqual([False, True],
+                         [timing.phases['reused']
+                          for timing in http.get_timings()])
+        self.assertEqual([timing.phases for timing in http.get_timings()],
+                         timings)
+
+    def test_prewarm(self):
+        http = self._client()
+        http.pool.dns_cache = pool.DNSCache()
+        http.warm_up(connections=2)
+        self.assertEqual('tenant', http.auth_token)
+        self.assertEqual(2, http.pool.size())
+        self.assertTrue(('127.0.0.1', self.port) in http.pool.dns_cache)
+        http.get('/instances/1')
+        self.assertTrue(http.get_timings()[-1].phases['reused'])
+
+    def test_dbaas_prewarm(self):
+        dbaas = client.Dbaas('user', 'key', 'tenant', None,
+                             service_url='http://127.0.0.1:%d' % self.port,
+                             auth_strategy='fake')
+        self.addCleanup(dbaas.client.pool.clear)
+        dbaas.prewarm(connections=3).join()
+        self.assertEqual(3, dbaas.client.pool.size())
+        self.assertEqual('tenant', dbaas.client.auth_token)
+        self.assertTrue(dbaas.client.pool.dns_cache is not None)
+
+    def test_shared_pool_keeps_each_clients_timeout(self):
+        first = self._client(timeout=5)
+        second = self._client(timeout=30, pool=first.pool)
+        for http in (first, second):
+            http.authenticate_with_token('token')
+        first.get('/instances/1')
+        second.get('/instances/1')
+        self.assertTrue(second.get_timings()[0].phases['reused'])
+        self.assertEqual(1, first.pool.size())
+        conn = first.pool.acquire(('http', '127.0.0.1', self.port))
+        self.addCleanup(conn.close)
+        self.assertEqual(30, conn.sock.gettimeout())
+
+
+class TLSLoopbackTest(TestCase):
+
+    def setUp(self):
+        super(TLSLoopbackTest, self).setUp()
+        self.server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.socket = ssl.wrap_socket(self.server.socket,
+                                             certfile=CERT, server_side=True)
+        # Rejected handshakes are expected; keep them out of the output.
+        self.server.handle_error = lambda request, address: None
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def _client(self, **kwargs):
+        http = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', None, 'Reddwarf',
+            service_url='https://localhost:%d' % self.port,
+            auth_strategy='fake', **kwargs)
+        http.authenticate_with_token('token')
+        self.addCleanup(http.pool.clear)
+        return http
+
+    def _phases(self, http):
+        return [timing.phases for timing in http.get_timings()]
+
+    def test_insecure(self):
+        http = self._client(insecure=True)
+        http.get('/instances/1')
+        http.get('/instances/1')
+        first, second = self._phases(http)
+        self.assertFalse(first['reused'])
+        self.assertTrue(first['tls'] > 0)
+        self.assertTrue(second['reused'])
+        self.assertEqual(0.0, second['tls'])
+        stats = http.pool.tls_sessions.stats()
+        self.assertEqual(1, stats['resumed'] + stats['full'])
+        if not pool.supports_sessions(ssl):
+            self.assertEqual(0, stats['resumed'])
+
+    def test_validating(self):
+        http = self._client()
+        http.ca_certs = CERT
+        resp, body = http.get('/instances/1')
+        self.assertEqual(200, resp.status)
+        self.assertTrue(self._phases(http)[0]['tls'] > 0)
+
+    def test_insecure_connections_are_not_reused_by_validating_clients(self):
+        connections = pool.ConnectionPool()
+        self.addCleanup(connections.clear)
+        insecure = self._client(insecure=True, pool=connections)
+        insecure.get('/instances/1')
+        self.assertEqual(1, connections.size())
+        validating = self._client(pool=connections)
+        self.assertRaises(exceptions.ClientException, validating.get,
+                          '/instances/1')
+        # The insecure client still gets its own connection back.
+        insecure.get('/instances/1')
+        self.assertTrue(self._phases(insecure)[-1]['reused'])
+
+    def test_untrusted_certificate_is_rejected(self):
+        http = self._client()
+        self.assertRaises(exceptions.ClientException, http.get,
+                          '/instances/1')
+        self.assertEqual(0, http.pool.size())
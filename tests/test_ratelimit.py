@@ -0,0 +1,62 @@
+from testtools import TestCase
+from reddwarfclient import ratelimit
+
+
+class TokenBucketTest(TestCase):
+
+    def test_bursts_then_paces(self):
+        bucket = ratelimit.TokenBucket(2, capacity=2)
+        now = bucket.updated
+        self.assertEqual(0, bucket.reserve(now))
+        self.assertEqual(0, bucket.reserve(now))
+        self.assertEqual(0.5, bucket.reserve(now))
+        self.assertEqual(1.0, bucket.reserve(now))
+        # Refills with time.
+        self.assertEqual(0.5, bucket.reserve(now + 1.0))
+
+    def test_slow_down_and_speed_up(self):
+        bucket = ratelimit.TokenBucket(4, max_rate=4)
+        now = bucket.updated
+        bucket.slow_down(retry_after=10, now=now)
+        self.assertEqual(2, bucket.rate)
+        self.assertEqual(10, bucket.reserve(now))
+        bucket.speed_up(5)
+        self.assertEqual(4, bucket.rate)
+
+
+class RateLimiterTest(TestCase):
+
+    def setUp(self):
+        super(RateLimiterTest, self).setUp()
+        self.limiter = ratelimit.RateLimiter()
+
+    def test_unlimited_by_default(self):
+        for i in range(100):
+            self.assertEqual(0, self.limiter.reserve('GET', '/instances'))
+
+    def test_limits_by_verb_and_url(self):
+        self.limiter.add_limit('POST', '^/instances', 1, 'SECOND')
+        self.assertEqual(0, self.limiter.reserve('POST', '/instances'))
+        self.assertTrue(self.limiter.reserve('POST', '/instances') > 0)
+        self.assertEqual(0, self.limiter.reserve('GET', '/instances'))
+        self.assertEqual(0, self.limiter.reserve('POST', '/mgmt/hosts'))
+
+    def test_load_limits(self):
+        self.limiter.load_limits({'rate': [
+            {'regex': '.*', 'uri': '*',
+             'limit': [{'verb': 'POST', 'value': 10, 'unit': 'MINUTE'},
+                       {'verb': 'GET', 'value': 120, 'unit': 'MINUTE'}]}]})
+        self.assertEqual(2, len(self.limiter.rules))
+        self.assertEqual(2, self.limiter.rules[1][2].rate)
+
+    def test_learns_from_over_limit(self):
+        self.limiter.over_limit('DELETE', '/instances/1', retry_after=30)
+        self.assertTrue(self.limiter.reserve('DELETE', '/instances/2') >= 29)
+        self.assertEqual(0, self.limiter.reserve('GET', '/instances/2'))
+
+    def test_acquire_sleeps(self):
+        self.limiter.add_limit('*', '.*', 1, 'SECOND')
+        sleeps = []
+        self.limiter.acquire('GET', '/flavors', sleep=sleeps.append)
+        self.limiter.acquire('GET', '/flavors', sleep=sleeps.append)
+        self.assertEqual(1, len(sleeps))
@@ -0,0 +1,124 @@
+import httplib
+import socket
+import time
+from testtools import TestCase
+from reddwarfclient import client
+from reddwarfclient import exceptions
+from reddwarfclient import retry
+
+
+class FakeResponse(dict):
+
+    def __init__(self, status, **headers):
+        super(FakeResponse, self).__init__(headers)
+        self.status = status
+
+
+class RetryPolicyTest(TestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(None, retry.parse_retry_after(None))
+        self.assertEqual(None, retry.parse_retry_after('soon'))
+        self.assertEqual(5.0, retry.parse_retry_after('5'))
+        now = time.mktime((2012, 10, 18, 0, 0, 0, 0, 0, -1))
+        http_date = time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                                  time.gmtime(now + 10))
+        self.assertEqual(10, retry.parse_retry_after(http_date, now=now))
+        iso_date = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now + 7))
+        self.assertEqual(7, retry.parse_retry_after(iso_date, now=now))
+
+    def test_only_idempotent_methods_by_default(self):
+        policy = retry.RetryPolicy()
+        self.assertTrue(policy.should_retry('GET', 1, status=503))
+        self.assertTrue(policy.should_retry('delete', 1, status=503))
+        self.assertFalse(policy.should_retry('POST', 1, status=503))
+
+    def test_attempts_per_status_and_exception(self):
+        policy = retry.RetryPolicy(statuses={500: 2},
+                                   exceptions={socket.error: 3})
+        self.assertTrue(policy.should_retry('GET', 1, status=500))
+        self.assertFalse(policy.should_retry('GET', 2, status=500))
+        self.assertFalse(policy.should_retry('GET', 1, status=404))
+        reset = socket.error(104, 'Connection reset by peer')
+        self.assertTrue(policy.should_retry('GET', 2, error=reset))
+        self.assertFalse(policy.should_retry('GET', 3, error=reset))
+        # The transport error wins over the status httplib2 made up for it.
+        self.assertFalse(policy.should_retry(
+            'GET', 1, status=500, error=httplib.BadStatusLine('')))
+
+    def test_delay(self):
+        policy = retry.RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertEqual([1, 2, 4, 5],
+                         [policy.delay(attempt) for attempt in range(1, 5)])
+        self.assertEqual(30, policy.delay(1, retry_after=30))
+        jittered = retry.RetryPolicy(backoff=1, max_backoff=5)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= jittered.delay(attempt) <= 5)
+
+
+class ClientRetryTest(TestCase):
+
+    def setUp(self):
+        super(ClientRetryTest, self).setUp()
+        self.client = client.ReddwarfHTTPClient(
+            'user', 'password', 'tenant', 'http://localhost:5000/v2.0',
+            'Reddwarf', auth_strategy='fake',
+            retry_policy=retry.RetryPolicy(backoff=1, jitter=False))
+        self.sleeps = []
+        self.client.sleep = self.sleeps.append
+
+    def _responses(self, *outcomes):
+        outcomes = list(outcomes)
+
+        def request():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome, None
+        return request
+
+    def test_retries_with_backoff_until_success(self):
+        ok = FakeResponse(200)
+        request = self._responses(FakeResponse(503),
+                                  exceptions.ClientException(500), ok)
+        self.assertEqual((ok, None), self.client._retry('GET', request))
+        self.assertEqual([1, 2], self.sleeps)
+
+    def test_honours_retry_after(self):
+        ok = FakeResponse(200)
+        over_limit = exceptions.OverLimit(413, retry_after='3')
+        request = self._responses(over_limit, ok)
+        self.assertEqual((ok, None), self.client._retry('GET', request))
+        self.assertEqual([3.0], self.sleeps)
+
+    def test_gives_up(self):
+        request = self._responses(*[exceptions.ClientException(500)] * 3)
+        self.assertRaises(exceptions.ClientException, self.client._retry,
+                          'GET', request)
+        self.assertEqual(2, len(self.sleeps))
+
+    def test_post_is_not_retried(self):
+        request = self._responses(exceptions.ClientException(500))
+        self.assertRaises(exceptions.ClientException, self.client._retry,
+                          'POST', request)
+        self.assertEqual([], self.sleeps)
+
+    def test_unparsable_error_pages_are_retried(self):
+        import httplib2
+        page = '<html><body>503 Service Unavailable</body></html>'
+        responses = [(httplib2.Response({'status': 503}), page),
+                     (httplib2.Response({'status': 503}), page),
+                     (httplib2.Response({'status': 200}), '{"a": 1}')]
+        self.client._pooled_request = lambda *args, **kwargs: \
+            responses.pop(0)
+        self.client.authenticate_with_token('token', 'http://localhost')
+        resp, body = self.client.get('/instances')
+        self.assertEqual((200, {'a': 1}), (resp.status, body))
+        self.assertEqual([1, 2], self.sleeps)
+
+    def test_over_limit_body(self):
+        body = {'overLimit': {'code': 413, 'message': 'Slow down',
+                              'retryAfter': '12'}}
+        error = exceptions.from_response(FakeResponse(413), body)
+        self.assertTrue(isinstance(error, exceptions.OverLimit))
+        self.assertEqual('12', error.retry_after)
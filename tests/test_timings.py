@@ -0,0 +1,37 @@
+from testtools import TestCase
+from reddwarfclient.timings import Timing
+from reddwarfclient.timings import TimingLog
+
+
+class TimingTest(TestCase):
+
+    def test_unpacks_like_a_tuple(self):
+        phases = {'ttfb': 0.25, 'reused': True}
+        timing = Timing("GET /a", 1, 2, phases)
+        item, start, end = timing
+        self.assertEqual(("GET /a", 1, 2), timing)
+        self.assertEqual(phases, timing.phases)
+        self.assertEqual(None, Timing("GET /a", 1, 2).phases)
+
+
+class TimingLogTest(TestCase):
+
+    def test_keeps_the_most_recent(self):
+        log = TimingLog(maxlen=2)
+        for i in range(3):
+            log.append(("GET /%d" % i, i, i + 0.5 * (i + 1)))
+        self.assertEqual(2, len(log))
+        self.assertEqual(["GET /1", "GET /2"], [item for item, _, _ in log])
+        self.assertEqual(("GET /2", 2, 3.5), log[-1])
+
+    def test_summary_covers_every_request(self):
+        log = TimingLog(maxlen=1)
+        self.assertEqual({'count': 0, 'total': 0.0, 'mean': None,
+                          'min': None, 'max': None}, log.summary())
+        log.append(("GET /a", 10, 11))
+        log.append(("GET /b", 20, 23))
+        self.assertEqual({'count': 2, 'total': 4.0, 'mean': 2.0,
+                          'min': 1, 'max': 3}, log.summary())
+        log.clear()
+        self.assertEqual(0, len(log))
+        self.assertEqual(0, log.summary()['count'])
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import time
+from testtools import TestCase
+from reddwarfclient import auth
+from reddwarfclient import tokencache
+
+
+def make_body(expires):
+    return {'access': {'token': {'id': 'token-id', 'expires': expires},
+                       'serviceCatalog': []}}
+
+
+def isotime(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+class ParseExpiresTest(TestCase):
+
+    def test_formats(self):
+        self.assertEqual(1350561600,
+                         tokencache.parse_expires('2012-10-18T12:00:00Z'))
+        self.assertEqual(1350561600, tokencache.parse_expires(
+            '2012-10-18T12:00:00.000000Z'))
+        self.assertEqual(1350561600, tokencache.parse_expires(
+            '2012-10-18T07:00:00.000-05:00'))
+        self.assertEqual(1350561600,
+                         tokencache.parse_expires('2012-10-18T12:00:00'))
+        self.assertEqual(None, tokencache.parse_expires('tomorrow'))
+        self.assertEqual(None, tokencache.parse_expires(None))
+
+
+class TokenCacheTest(TestCase):
+
+    def setUp(self):
+        super(TokenCacheTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.cache = tokencache.TokenCache(os.path.join(self.path, 'tokens'))
+        self.key = self.cache.key('http://auth/v2.0', 'user', 'tenant',
+                                  'RegionOne', 'secret')
+
+    def test_key(self):
+        self.assertNotEqual(self.key, self.cache.key(
+            'http://auth/v2.0', 'user', 'tenant', 'RegionTwo', 'secret'))
+        self.assertNotEqual(self.key, self.cache.key(
+            'http://auth/v2.0', 'user', 'tenant', 'RegionOne', 'wrong'))
+
+    def test_put_and_get(self):
+        self.assertEqual(None, self.cache.get(self.key))
+        body = make_body(isotime(time.time() + 3600))
+        self.assertTrue(self.cache.put(self.key, body))
+        self.assertEqual((body, 'access'), self.cache.get(self.key))
+        mode = os.stat(os.path.join(self.cache.path, self.key + '.json'))
+        self.assertEqual(0600, mode.st_mode & 0777)
+        self.cache.delete(self.key)
+        self.assertEqual(None, self.cache.get(self.key))
+
+    def test_expiring_tokens_are_not_handed_out(self):
+        self.cache.put(self.key, make_body(isotime(time.time() + 30)))
+        self.assertEqual(None, self.cache.get(self.key))
+        self.cache.margin = 0
+        self.assertNotEqual(None, self.cache.get(self.key))
+
+    def test_tokens_without_expiry_are_not_kept(self):
+        self.assertFalse(self.cache.put(self.key, {'access': {}}))
+        self.assertEqual(None, self.cache.get(self.key))
+
+    def test_corrupt_entry(self):
+        with self.cache.lock(self.key):
+            path = os.path.join(self.cache.path, self.key + '.json')
+            with open(path, 'w') as entry_file:
+                entry_file.write('{"expires": ')
+        self.assertEqual(None, self.cache.get(self.key))
+
+    def _wait_for(self, holder, times):
+        """Returns the sleeps of self.cache waiting on a lock ``holder``
+        has, until it gives up after ``times`` of them."""
+        class Waited(Exception):
+            pass
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == times:
+                raise Waited()
+        with holder.lock(self.key):
+            self.assertRaises(Waited,
+                              self.cache.lock(self.key, sleep).__enter__)
+        return sleeps
+
+    def test_lock_polls_for_another_thread(self):
+        self.assertEqual([tokencache.LOCK_POLL_INTERVAL] * 3,
+                         self._wait_for(self.cache, 3))
+        with self.cache.lock(self.key):
+            pass
+
+    def test_lock_polls_for_another_process(self):
+        if tokencache.fcntl is None:
+            self.skipTest("Needs fcntl.")
+        # Another TokenCache only shares the lock file, like a process.
+        other = tokencache.TokenCache(self.cache.path)
+        self.assertEqual([tokencache.LOCK_POLL_INTERVAL] * 2,
+                         self._wait_for(other, 2))
+        with self.cache.lock(self.key):
+            pass
+
+
+class FakeClient(object):
+
+    def __init__(self, token_cache, body):
+        self.token_cache = token_cache
+        self.body = body
+        self.logins = 0
+
+    def _time_request(self, url, method, **kwargs):
+        import httplib2
+        self.logins += 1
+        return httplib2.Response({'status': 200}), self.body
+
+
+class CachedLoginTest(TestCase):
+
+    def test_login_is_cached(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        body = make_body(isotime(time.time() + 3600))
+        client = FakeClient(tokencache.TokenCache(path), body)
+        for i in range(2):
+            authenticator = auth.KeyStoneV2Authenticator(
+                client, 'keystone', 'http://auth/v2.0', 'user', 'key',
+                'tenant', service_url='http://dbaas/v1.0/tenant')
+            catalog = authenticator.authenticate()
+            self.assertEqual('token-id', catalog.get_token())
+        self.assertEqual(1, client.logins)
+        authenticator.forget_token()
+        authenticator.authenticate()
+        self.assertEqual(2, client.logins)
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+from testtools import TestCase
+from reddwarfclient import base
+from reddwarfclient import common
+from reddwarfclient import tracing
+
+
+class ListExporter(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class TracerTest(TestCase):
+
+    def setUp(self):
+        super(TracerTest, self).setUp()
+        self.exporter = ListExporter()
+        self.tracer = tracing.Tracer(self.exporter)
+
+    def test_children_share_the_trace(self):
+        with self.tracer.span('Instances.list') as parent:
+            self.assertTrue(self.tracer.current() is parent)
+            with self.tracer.span('http', method='GET') as child:
+                child.set('status', 200)
+        self.assertEqual(None, self.tracer.current())
+        self.assertEqual([child, parent], self.exporter.spans)
+        self.assertEqual(parent.trace_id, child.trace_id)
+        self.assertEqual(parent.span_id, child.parent_id)
+        self.assertEqual(None, parent.parent_id)
+        self.assertEqual({'method': 'GET', 'status': 200}, child.attributes)
+        self.assertTrue(parent.duration >= child.duration >= 0)
+
+    def test_errors_are_recorded(self):
+        def fail():
+            with self.tracer.span('auth'):
+                raise ValueError("bad")
+        self.assertRaises(ValueError, fail)
+        self.assertEqual("ValueError: bad", self.exporter.spans[0].error)
+
+    def test_null_span(self):
+        with tracing.span(None, 'http') as span:
+            span.set('status', 200)
+        self.assertTrue(span is tracing.NULL_SPAN)
+
+    def test_traced_manager(self):
+        class Instances(object):
+            name = 'instances'
+
+            def list(self):
+                return [1]
+
+        manager = tracing.TracedManager(Instances(), self.tracer)
+        self.assertEqual('instances', manager.name)
+        self.assertEqual([1], manager.list())
+        self.assertEqual(['Instances.list'],
+                         [span.name for span in self.exporter.spans])
+
+    def test_resources_use_the_traced_manager(self):
+        class Instance(base.Resource):
+            def restart(self):
+                self.manager.restart(self.id)
+
+        class Instances(object):
+            resource_class = Instance
+
+            def get(self, id):
+                return Instance(self, {'id': id}, loaded=True)
+
+            def list(self):
+                return [self.get(1)]
+
+            def index(self):
+                return common.Paginated([self.get(2)])
+
+            def restart(self, id):
+                pass
+
+        manager = tracing.TracedManager(Instances(), self.tracer)
+        self.assertTrue(manager.resource_class is Instance)
+        manager.get(1).restart()
+        manager.list()[0].restart()
+        manager.index()[0].restart()
+        self.assertEqual(['Instances.get', 'Instances.restart',
+                          'Instances.list', 'Instances.restart',
+                          'Instances.index', 'Instances.restart'],
+                         [span.name for span in self.exporter.spans])
+
+    def test_json_lines_exporter(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'trace.jsonl')
+        exporter = tracing.JSONLinesExporter(path)
+        tracer = tracing.Tracer(exporter)
+        with tracer.span('a'):
+            with tracer.span('b', url='/x'):
+                pass
+        exporter.close()
+        lines = [json.loads(line) for line in open(path)]
+        self.assertEqual(['b', 'a'], [line['name'] for line in lines])
+        self.assertEqual({'url': '/x'}, lines[0]['attributes'])
+        self.assertEqual(lines[1]['span_id'], lines[0]['parent_id'])
@@ -188,3 +188,23 @@ class XmlTest(TestCase):
             self.fail("ResponseFormatError exception expected")
         except exceptions.ResponseFormatError:
             pass
+
+    def test_iter_response_list(self):
+        from reddwarfclient import exceptions
+        client = xml.ReddwarfXmlClient("user", "password", "tenant",
+                                       "auth_url", "service_name",
+                                       auth_strategy="fake")
+        body = ("<instances xmlns='http://docs.openstack.org/database/api/"
+                "v1.0'><instance id='1'><links><link href='a'/></links>"
+                "</instance><instance id='2'/><links><link rel='next' "
+                "href='b'/></links></instances>")
+        extras = {}
+        items = client.iter_response_list(body, 'instances', extras)
+        self.assertEqual({'id': '1', 'links': [{'href': 'a'}]}, items.next())
+        self.assertEqual([{'id': '2'}], list(items))
+        self.assertEqual({'links': [{'rel': 'next', 'href': 'b'}]}, extras)
+
+        self.assertRaises(KeyError, list,
+                          client.iter_response_list(body, 'users', {}))
+        self.assertRaises(exceptions.ResponseFormatError, list,
+                          client.iter_response_list("<a><b>", 'a', {}))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#    Copyright 2012 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares the installed JSON codecs on /mgmt/instances sized payloads.
+
+Usage: bench_json.py [instances per page] [repeats]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from reddwarfclient import codec
+
+
+def mgmt_instance(index):
+    instance_id = "%08x-1111-2222-3333-%012x" % (index, index)
+    href = "http://localhost:8779/v1.0/tenant/mgmt/instances/%s" % instance_id
+    return {
+        "id": instance_id,
+        "name": "instance-%d" % index,
+        "status": "ACTIVE",
+        "created": "2012-10-18T00:00:00",
+        "updated": "2012-10-18T00:05:00",
+        "deleted": False,
+        "deleted_at": None,
+        "account_id": "tenant-%d" % (index % 50),
+        "host": "compute-%d.example.com" % (index % 200),
+        "task_description": "No tasks for the instance.",
+        "flavor": {
+            "id": "1",
+            "links": [{"href": "http://localhost:8779/v1.0/flavors/1",
+                       "rel": "self"},
+                      {"href": "http://localhost:8779/flavors/1",
+                       "rel": "bookmark"}],
+        },
+        "links": [{"href": href, "rel": "self"},
+                  {"href": href.replace("/v1.0", ""), "rel": "bookmark"}],
+        "server": {
+            "id": "%08x-aaaa-bbbb-cccc-%012x" % (index, index),
+            "name": "instance-%d" % index,
+            "status": "ACTIVE",
+            "host": "compute-%d" % (index % 200),
+            "tenant_id": "tenant-%d" % (index % 50),
+            "addresses": {"private": [{"addr": "10.0.%d.%d" %
+                                       (index / 250 % 250, index % 250),
+                                       "version": 4}]},
+        },
+        "volume": {
+            "id": "%08x-dddd-eeee-ffff-%012x" % (index, index),
+            "size": 2,
+            "used": 0.16,
+            "status": "in-use",
+            "availability_zone": "nova",
+            "created_at": "2012-10-18T00:00:00",
+        },
+    }
+
+
+def payload(count):
+    return {"instances": [mgmt_instance(i) for i in range(count)],
+            "links": [{"href": "http://localhost:8779/v1.0/tenant/mgmt/"
+                               "instances?marker=%d" % count,
+                       "rel": "next"}]}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    body = payload(count)
+    wire = codec.get_codec('json').dumps(body)
+    print("%d instances, %d bytes on the wire, best of %d runs (ms)"
+          % (count, len(wire), repeats))
+    print("%-12s %10s %10s" % ("codec", "loads", "dumps"))
+    for name in codec.PREFERENCE:
+        json_codec = codec.codecs.get(name)
+        if json_codec is None:
+            print("%-12s %21s" % (name, "not installed"))
+            continue
+        loads = min(timeit.repeat(lambda: json_codec.loads(wire),
+                                  number=1, repeat=repeats))
+        dumps = min(timeit.repeat(lambda: json_codec.dumps(body),
+                                  number=1, repeat=repeats))
+        print("%-12s %10.2f %10.2f" % (name, loads * 1000, dumps * 1000))
+    print("default: %s" % codec.default().name)
+
+
+if __name__ == '__main__':
+    main()